@@ -0,0 +1,225 @@
+"""
+Semantic cache of chat answers.
+
+Crews ask the same few questions about a patient ("allergies?", "current
+medication?") again and again. Answers are cached per scope, the journal text
+plus anything else the answer depends on (crew notes, photos), and a new
+question is answered from the cache when it matches a previous one in that
+scope: exactly after normalization, or, once the FHI engine has loaded its
+all-MiniLM-L6-v2 embedding function, by cosine similarity above a threshold.
+Until the model is loaded only normalized matches hit.
+
+The embedding model is English and short Norwegian questions that differ in
+one word ("blodtype?", "blodtrykk?") can embed almost identically, so a
+semantic hit also needs the same content words: the questions may differ
+only in stopwords, word order and words like "patient". Negations count as
+content words.
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from os import environ
+from typing import Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from bm25 import load_stopwords, tokenize
+from rag_fhi import get_shared_fhi_recommendations
+
+load_dotenv()
+
+# Kept high: a false hit answers a different question about the patient
+ANSWER_CACHE_SIMILARITY = float(environ.get("ANSWER_CACHE_SIMILARITY", 0.92))
+ANSWER_CACHE_TTL_SECONDS = float(environ.get("ANSWER_CACHE_TTL_SECONDS", 6 * 60 * 60))
+ANSWER_CACHE_MAX_ENTRIES = int(environ.get("ANSWER_CACHE_MAX_ENTRIES", 2000))
+
+# Words every question about the patient may or may not contain
+QUESTION_FILLER_WORDS = {"patient", "patients", "pasient", "pasienten", "pasientens", "pas"}
+# Stopwords that change the meaning of a question and so must match
+NEGATIONS = {
+    "not", "no", "nor", "never", "without", "don", "doesn", "didn", "isn", "aren", "wasn", "weren",
+    "hasn", "haven", "hadn", "won", "wouldn", "shouldn", "couldn", "mustn", "needn",
+    "ikke", "ingen", "intet", "uten", "aldri", "verken", "hverken",
+}
+
+_ignored_words = None
+
+
+def _shared_ignored_words():
+    global _ignored_words
+    if _ignored_words is None:
+        _ignored_words = (load_stopwords() | QUESTION_FILLER_WORDS) - NEGATIONS
+    return _ignored_words
+
+
+def answer_scope(journal_text: str, *context: str) -> str:
+    """Key of everything an answer depends on besides the question."""
+    digest = hashlib.sha256(journal_text.encode("utf-8"))
+    for part in context:
+        digest.update(b"\0" + str(part).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase without punctuation or repeated whitespace."""
+    return " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+
+
+def content_words(question: str) -> frozenset:
+    """Words of a question that carry its meaning: no stopwords or filler, but negations."""
+    return frozenset(tokenize(question, _shared_ignored_words()))
+
+
+class _Entry:
+    def __init__(self, question: str, answer: str, embedding):
+        self.question = question
+        self.answer = answer
+        self.embedding = embedding
+        self.content_words = content_words(question)
+        self.created_at = time.time()
+
+
+class AnswerCache:
+    """
+    In-memory answer cache with TTL and least-recently-used eviction.
+
+    Entries are keyed by (scope, normalized question); a scope's entries are
+    compared by embedding only with each other, so answers never leak
+    between patients.
+    """
+
+    def __init__(self, similarity: float = ANSWER_CACHE_SIMILARITY, ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES, embed: Optional[Callable[[str], object]] = None):
+        self.similarity = similarity
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # Defaults to the FHI engine's embedding function once it is loaded
+        self._embed = embed or self._embed_with_fhi_model
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        # scope -> normalized questions cached for it
+        self._scopes: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _embed_with_fhi_model(question: str):
+        rag = get_shared_fhi_recommendations()
+        if not rag.is_ready:
+            # Load the model in the background; exact matches only until then
+            rag.start_background_init()
+            return None
+        import numpy as np
+
+        vector = np.asarray(rag.embedding_function([question])[0], dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def _embedding(self, question: str):
+        try:
+            return self._embed(question)
+        except Exception as e:
+            print(f"Could not embed question for the answer cache: {e}")
+            return None
+
+    def _drop(self, key: Tuple[str, str]) -> None:
+        # Called with self._lock held
+        del self._entries[key]
+        questions = self._scopes[key[0]]
+        questions.remove(key[1])
+        if not questions:
+            del self._scopes[key[0]]
+
+    def lookup(self, scope: str, question: str) -> Tuple[Optional[str], object]:
+        """
+        Find a cached answer to the question in scope.
+
+        Returns:
+            (answer or None, the question's embedding to pass on to put())
+        """
+        normalized = normalize_question(question)
+        words = content_words(question)
+        now = time.time()
+        embedding = None
+        for attempt in ("exact", "semantic"):
+            if attempt == "semantic":
+                # Embedded outside the lock; the model call takes milliseconds
+                embedding = self._embedding(question)
+                if embedding is None:
+                    break
+            with self._lock:
+                if attempt == "exact":
+                    candidates = [normalized] if (scope, normalized) in self._entries else []
+                else:
+                    candidates = list(self._scopes.get(scope, []))
+                best_key, best_similarity = None, self.similarity
+                for candidate in candidates:
+                    key = (scope, candidate)
+                    entry = self._entries[key]
+                    if now - entry.created_at > self.ttl_seconds:
+                        self._drop(key)
+                        self.expirations += 1
+                        continue
+                    if attempt == "exact":
+                        best_key = key
+                        break
+                    # Similar wording is not enough, the questions must ask about the same things
+                    if entry.embedding is None or entry.content_words != words:
+                        continue
+                    similarity = float(entry.embedding @ embedding)
+                    if similarity >= best_similarity:
+                        best_key, best_similarity = key, similarity
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    if attempt == "exact":
+                        self.exact_hits += 1
+                    else:
+                        self.semantic_hits += 1
+                    return self._entries[best_key].answer, embedding
+        with self._lock:
+            self.misses += 1
+        return None, embedding
+
+    def put(self, scope: str, question: str, answer: str, embedding=None) -> None:
+        """Cache an answer, embedding the question unless lookup() already did."""
+        if embedding is None:
+            embedding = self._embedding(question)
+        key = (scope, normalize_question(question))
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = _Entry(question, answer, embedding)
+            self._scopes.setdefault(scope, []).append(key[1])
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def get_or_compute(self, scope: str, question: str, compute: Callable[[], str]) -> str:
+        """Return the cached answer to question in scope, or compute and cache it."""
+        answer, embedding = self.lookup(scope, question)
+        if answer is None:
+            answer = compute()
+            self.put(scope, question, answer, embedding)
+        return answer
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "scopes": len(self._scopes),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+# Shared by the Streamlit chat and the API
+answer_cache = AnswerCache()
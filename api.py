@@ -1,12 +1,23 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from werkzeug.utils import secure_filename
 import os
-import tempfile
+import json
 from datetime import datetime
-from fuzzywuzzy import fuzz
-import PyPDF2
-from nebius_vision import vision_inference
-from nebius_inference import inference
+from nebius_vision import image_cache, vision_inference
+from nebius_inference import inference, inference_stream, warm_up
+from rag_fhi import get_shared_fhi_recommendations
+from patient_registry import get_patient_registry
+from patient_store import get_patient_store
+from journal_cache import journal_cache, get_journal_text
+from journal_retrieval import get_relevant_journal_context
+from answer_cache import answer_cache, answer_scope
+from image_store import image_store
+from patient_briefing import get_pdf_summary
+from batch_briefing import BATCH_MAX_PATIENTS, brief_patients
+from prefetch import get_prefetcher
+from llm_gateway import get_gateway
+from singleflight import llm_singleflight
+from jobs import DEFAULT_PRIORITY, QueueFull, job_queue
 from dotenv import load_dotenv
 from flask_swagger_ui import get_swaggerui_blueprint
 from os import environ
@@ -14,6 +25,11 @@ from flask_cors import CORS
 
 load_dotenv()
 
+# Spawned journal extraction workers re-run this script as __mp_main__ when the
+# API is started with `python api.py`; only the server process writes files,
+# watches the patient directories, prefetches and warms up
+SERVER_PROCESS = __name__ != "__mp_main__"
+
 app = Flask(__name__)
 CORS(app, resources={
     r"/api/*": {
@@ -74,14 +90,98 @@ swagger_config = {
                         "type": "string",
                         "required": True,
                         "description": "Patient ID",
+                    },
+                    {
+                        "name": "async",
+                        "in": "query",
+                        "type": "boolean",
+                        "required": False,
+                        "description": "Run as a background job and return 202 with a job id to poll",
+                    },
+                    {
+                        "name": "priority",
+                        "in": "query",
+                        "type": "string",
+                        "enum": ["high", "normal", "low"],
+                        "required": False,
+                        "description": "Job priority class when async (default normal)",
+                    },
+                ],
+                "responses": {
+                    "200": {"description": "Journal text and summary"},
+                    "202": {"description": "Job queued; poll /api/jobs/{job_id}"},
+                },
+            }
+        },
+        "/api/load_journals": {
+            "post": {
+                "summary": "Load the briefs of many patients at once",
+                "description": "Journals are read in parallel and summarized on a bounded pool. The response is "
+                               "newline-delimited JSON with one line per patient, in the order they complete, "
+                               "holding either a summary or an error, followed by a line with the totals.",
+                "produces": ["application/x-ndjson"],
+                "parameters": [
+                    {
+                        "name": "body",
+                        "in": "body",
+                        "required": True,
+                        "schema": {
+                            "type": "object",
+                            "properties": {
+                                "patient_ids": {"type": "array", "items": {"type": "string"}, "maxItems": 50},
+                                "include_text": {"type": "boolean", "default": False},
+                            },
+                        },
                     }
                 ],
-                "responses": {"200": {"description": "Journal text and summary"}},
+                "responses": {
+                    "200": {"description": "One JSON object per line: {patient_id, summary[, text]} or {patient_id, error}, then {done, patients, failed, seconds}"},
+                    "400": {"description": "Missing patient_ids or too many patients"},
+                },
             }
         },
         "/api/ask_question": {
             "post": {
                 "summary": "Ask a question about a patient's journal",
+                "parameters": [
+                    {
+                        "name": "body",
+                        "in": "body",
+                        "required": True,
+                        "schema": {
+                            "type": "object",
+                            "properties": {
+                                "question": {"type": "string"},
+                                "text": {"type": "string"},
+                            },
+                        },
+                    },
+                    {
+                        "name": "async",
+                        "in": "query",
+                        "type": "boolean",
+                        "required": False,
+                        "description": "Run as a background job and return 202 with a job id to poll",
+                    },
+                    {
+                        "name": "priority",
+                        "in": "query",
+                        "type": "string",
+                        "enum": ["high", "normal", "low"],
+                        "required": False,
+                        "description": "Job priority class when async (default high)",
+                    },
+                ],
+                "responses": {
+                    "200": {"description": "Answer to the question"},
+                    "202": {"description": "Job queued; poll /api/jobs/{job_id}"},
+                },
+            }
+        },
+        "/api/ask_question_stream": {
+            "post": {
+                "summary": "Ask a question about a patient's journal, streaming the answer",
+                "produces": ["text/event-stream"],
                 "parameters": [
                     {
                         "name": "body",
@@ -96,7 +196,17 @@ swagger_config = {
                         },
                     }
                 ],
-                "responses": {"200": {"description": "Answer to the question"}},
+                "responses": {
+                    "200": {"description": "Server-sent events with one token per event"}
+                },
+            }
+        },
+        "/api/stats": {
+            "get": {
+                "summary": "Runtime statistics of the LLM gateway, request coalescing, caches, job queue and prefetching",
+                "responses": {
+                    "200": {"description": "Request counters, latency histogram, coalesced calls, image cache usage, job counts, prefetched patients and answer cache hit rate"}
+                },
             }
         },
         "/api/analyze_image": {
@@ -118,18 +228,63 @@ swagger_config = {
                         "required": False,
                         "description": "Optional journal text for context",
                     },
+                    {
+                        "name": "async",
+                        "in": "query",
+                        "type": "boolean",
+                        "required": False,
+                        "description": "Run as a background job and return 202 with a job id to poll",
+                    },
+                    {
+                        "name": "priority",
+                        "in": "query",
+                        "type": "string",
+                        "enum": ["high", "normal", "low"],
+                        "required": False,
+                        "description": "Job priority class when async (default normal)",
+                    },
+                ],
+                "responses": {
+                    "200": {"description": "Image analysis results"},
+                    "202": {"description": "Job queued; poll /api/jobs/{job_id}"},
+                },
+            }
+        },
+        "/api/jobs/{job_id}": {
+            "get": {
+                "summary": "Status and result of a background job",
+                "description": "Jobs live in the memory of the API process that queued them, so the API "
+                               "must run as a single process (e.g. gunicorn --workers 1 --threads 8); "
+                               "a poll served by another process answers 404.",
+                "parameters": [
+                    {
+                        "name": "job_id",
+                        "in": "path",
+                        "type": "string",
+                        "required": True,
+                        "description": "Job ID returned when the job was queued",
+                    },
+                    {
+                        "name": "wait",
+                        "in": "query",
+                        "type": "number",
+                        "required": False,
+                        "description": "Seconds to wait for the job to finish before answering (long poll, max 10)",
+                    },
                 ],
-                "responses": {"200": {"description": "Image analysis results"}},
+                "responses": {
+                    "200": {"description": "Job status, with the result or error once finished"},
+                    "404": {"description": "Unknown or expired job"},
+                },
             }
         },
     },
 }
 
 # Write swagger.json
-with open("static/swagger.json", "w") as f:
-    import json
-
-    json.dump(swagger_config, f)
+if SERVER_PROCESS:
+    with open("static/swagger.json", "w") as f:
+        json.dump(swagger_config, f)
 
 # Configure upload folders
 UPLOAD_FOLDER = "data/uploads"
@@ -141,64 +296,47 @@ app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16MB max file size
 
 
-def extract_text_from_pdf(pdf_file):
-    pdf_reader = PyPDF2.PdfReader(pdf_file)
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text() + "\n"
-    return text
+def get_document_prompt(text, question):
+    # Only the journal entries relevant to the question, so the prompt size stays constant
+    journal_context = get_relevant_journal_context(text, question)
+    return f"""These are excerpts from a patient journal, showing the medical history of the patient. Use this information if relevant when answering questions
 
+{journal_context}
 
-def get_pdf_summary(text):
-    prompt = f"""Please provide a comprehensive summary of the following text:
-    
-{text}
+Please answer this question: {question}
 
-Please make the summary concise but include all important points."""
-    return inference(prompt)
+Base your answer only on the information provided in the document. If the answer cannot be found in the document, please say so."""
 
 
 def get_document_response(text, question):
-    prompt = f"""This is a patient journal, showing the medical history of the patient. Use this information if relevant when answering questions
-
-{text}
+    # Repeated questions about the same journal are answered from the cache
+    return answer_cache.get_or_compute(
+        answer_scope(text), question, lambda: inference(get_document_prompt(text, question))
+    )
 
-Please answer this question: {question}
 
-Base your answer only on the information provided in the document. If the answer cannot be found in the document, please say so."""
-    return inference(prompt)
+def search_relevant_health_info(journal_text, analysis):
+    """Find FHI recommendations relevant to an image analysis."""
+    return rag.get_relevant_fhi_recommendations(analysis, max_recommendations=2)
 
 
-def load_patient_journals():
-    journals_dir = "data/journals"
-    journals = {}
-    for filename in os.listdir(journals_dir):
-        if filename.endswith(".pdf"):
-            try:
-                if " - " in filename:
-                    name_part, numbers = filename.replace(".pdf", "").split(" - ")
-                    dob, personal_number = numbers.split(" ")
-                    search_string = f"{name_part.lower()} {dob} {personal_number}"
-                else:
-                    search_string = filename.replace(".pdf", "").lower()
-                journals[search_string] = os.path.join(journals_dir, filename)
-            except ValueError:
-                print(f"Could not parse filename: {filename}")
-                continue
-    return journals
+if SERVER_PROCESS:
+    # Live search index of patient journals, updated as journals are added or removed
+    patient_journals = get_patient_registry().index
 
+    # Pre-extract journal text in the background
+    journal_cache.warm_up()
 
-def fuzzy_search(query, choices, threshold=65):
-    results = []
-    for choice in choices:
-        ratio = fuzz.partial_ratio(query.lower(), choice.lower())
-        if ratio >= threshold:
-            results.append((choice, ratio))
-    return sorted(results, key=lambda x: x[1], reverse=True)
+    # Brief patients in the background as soon as their emergency call log arrives
+    prefetcher = get_prefetcher()
 
+    # Shared FHI recommendations engine, initialized on the first query
+    rag = get_shared_fhi_recommendations()
 
-# Load patient journals on startup
-patient_journals = load_patient_journals()
+    # Optional background warm-up of the LLM client and FHI engine
+    if environ.get("WARM_UP_ON_START") == "1":
+        warm_up()
+        rag.start_background_init()
 
 
 @app.route("/api/search_patients", methods=["GET"])
@@ -207,8 +345,7 @@ def search_patients():
     if not query:
         return jsonify({"error": "Query parameter is required"}), 400
 
-    journal_keys = list(patient_journals.keys())
-    matching_results = fuzzy_search(query, journal_keys)
+    matching_results = patient_journals.search(query, limit=3)
 
     return jsonify(
         {
@@ -219,6 +356,43 @@ def search_patients():
     )
 
 
+# Longest a GET /api/jobs/<job_id> request waits for the job to finish; kept
+# short because the waiting request holds a web worker thread
+JOB_MAX_WAIT_SECONDS = 10
+
+
+def run_or_queue(kind, function, default_priority=DEFAULT_PRIORITY):
+    """
+    Run a slow request inline, or as a background job if the client asked for ?async=true.
+
+    Args:
+        kind: Job kind shown in the job status
+        function: Zero-argument callable returning the JSON-serializable response
+        default_priority: Priority class used unless the request gives ?priority=
+    """
+    if request.args.get("async", "").lower() not in ("1", "true", "yes"):
+        return jsonify(function())
+
+    priority = request.args.get("priority", default_priority)
+    try:
+        job = job_queue.submit(kind, function, priority)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except QueueFull as e:
+        return jsonify({"error": f"Job queue is full: {e}"}), 503, {"Retry-After": "5"}
+
+    status_url = f"/api/jobs/{job.id}"
+    return jsonify({"job_id": job.id, "status": job.status, "status_url": status_url}), 202, {"Location": status_url}
+
+
+def load_journal_result(patient_id):
+    # The index decides which journal the key means; the record only adds cached data for it
+    journal_path = patient_journals[patient_id]
+    record = get_patient_store().get_for_journal(patient_id, journal_path)
+    text = get_journal_text(journal_path)
+    return {"text": text, "summary": get_pdf_summary(text, journal_path, record)}
+
+
 @app.route("/api/load_journal", methods=["GET"])
 def load_journal():
     patient_id = request.args.get("patient_id")
@@ -226,22 +400,102 @@ def load_journal():
         return jsonify({"error": "Invalid patient_id"}), 400
 
     try:
-        with open(patient_journals[patient_id], "rb") as file:
-            text = extract_text_from_pdf(file)
-            summary = get_pdf_summary(text)
-            return jsonify({"text": text, "summary": summary})
+        return run_or_queue("load_journal", lambda: load_journal_result(patient_id))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/load_journals", methods=["POST"])
+def load_journals():
+    data = request.json
+    patient_ids = data.get("patient_ids") if data else None
+    if not isinstance(patient_ids, list) or not patient_ids:
+        return jsonify({"error": "patient_ids must be a non-empty list"}), 400
+    if len(patient_ids) > BATCH_MAX_PATIENTS:
+        return jsonify({"error": f"At most {BATCH_MAX_PATIENTS} patients per request"}), 400
+    include_text = bool(data.get("include_text", False))
+
+    def lines():
+        # Newline-delimited JSON: one line per patient as it completes, then a totals line
+        started = datetime.now()
+        failed = 0
+        for result in brief_patients([str(patient_id) for patient_id in patient_ids], patient_journals, include_text):
+            failed += "error" in result
+            yield json.dumps(result) + "\n"
+        seconds = (datetime.now() - started).total_seconds()
+        yield json.dumps({"done": True, "patients": len(set(map(str, patient_ids))), "failed": failed,
+                          "seconds": round(seconds, 3)}) + "\n"
+
+    return Response(
+        stream_with_context(lines()),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.route("/api/ask_question", methods=["POST"])
 def ask_question():
     data = request.json
     if not data or "question" not in data or "text" not in data:
         return jsonify({"error": "Question and text are required"}), 400
 
-    response = get_document_response(data["text"], data["question"])
-    return jsonify({"response": response})
+    # Questions come from crews waiting on an answer, so they go ahead of other jobs
+    return run_or_queue(
+        "ask_question", lambda: {"response": get_document_response(data["text"], data["question"])}, "high"
+    )
+
+
+@app.route("/api/ask_question_stream", methods=["POST"])
+def ask_question_stream():
+    data = request.json
+    if not data or "question" not in data or "text" not in data:
+        return jsonify({"error": "Question and text are required"}), 400
+
+    scope = answer_scope(data["text"])
+    answer, embedding = answer_cache.lookup(scope, data["question"])
+
+    def events():
+        # Server-sent events: one "data" event per token, then "done"
+        try:
+            if answer is not None:
+                # A cached answer is sent as a single token
+                yield f"data: {json.dumps({'token': answer})}\n\n"
+            else:
+                tokens = []
+                for token in inference_stream(get_document_prompt(data["text"], data["question"])):
+                    tokens.append(token)
+                    yield f"data: {json.dumps({'token': token})}\n\n"
+                answer_cache.put(scope, data["question"], "".join(tokens), embedding)
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+HEALTH_IMAGE_PROMPT = """Please analyze this image for any visible health issues or concerns. 
+        Focus on:
+        1. Any visible symptoms
+        2. Skin conditions
+        3. Physical abnormalities
+        4. Signs of distress or discomfort
+        
+        Provide a professional medical observation based on what you can see."""
+
+
+def analyze_image_result(image_data, filename, journal_text=None):
+    analysis = vision_inference(image_data, HEALTH_IMAGE_PROMPT)
+
+    # If journal text is provided, search for relevant information
+    relevant_info = None
+    if journal_text:
+        relevant_info = search_relevant_health_info(journal_text, analysis)
+
+    return {"filename": filename, "analysis": analysis, "relevant_info": relevant_info}
 
 
 @app.route("/api/analyze_image", methods=["POST"])
@@ -254,41 +508,44 @@ def analyze_image():
         return jsonify({"error": "No selected file"}), 400
 
     if file:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
         filename = secure_filename(f"patient_photo_{timestamp}.jpg")
         filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-        file.save(filepath)
 
-        # Create a temporary file for analysis
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp_file:
-            file.seek(0)
-            tmp_file.write(file.read())
-            tmp_path = tmp_file.name
+        # Analyze the upload in memory and save the original in the background
+        image_data = file.read()
+        image_store.persist(image_data, filepath)
 
-        # Analyze the image
-        health_prompt = """Please analyze this image for any visible health issues or concerns. 
-        Focus on:
-        1. Any visible symptoms
-        2. Skin conditions
-        3. Physical abnormalities
-        4. Signs of distress or discomfort
-        
-        Provide a professional medical observation based on what you can see."""
+        journal_text = request.form.get("journal_text")
+        return run_or_queue("analyze_image", lambda: analyze_image_result(image_data, filename, journal_text))
 
-        analysis = vision_inference(tmp_path, health_prompt)
 
-        # If journal text is provided, search for relevant information
-        journal_text = request.form.get("journal_text")
-        relevant_info = None
-        if journal_text:
-            relevant_info = search_relevant_health_info(journal_text, analysis)
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
 
-        # Clean up temporary file
-        os.unlink(tmp_path)
+    try:
+        wait = min(float(request.args.get("wait", 0)), JOB_MAX_WAIT_SECONDS)
+    except ValueError:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+    if wait > 0:
+        job.wait(wait)
+    return jsonify(job.to_dict())
+
+
+@app.route("/api/stats", methods=["GET"])
+def stats():
+    return jsonify({
+        "llm_gateway": get_gateway().stats.snapshot(),
+        "llm_singleflight": llm_singleflight.stats(),
+        "image_cache": image_cache.stats(),
+        "jobs": job_queue.stats(),
+        "prefetch": prefetcher.stats(),
+        "answer_cache": answer_cache.stats(),
+    })
 
-        return jsonify(
-            {"filename": filename, "analysis": analysis, "relevant_info": relevant_info}
-        )
 
 if __name__ == '__main__':
     # Use PORT environment variable if available (for Render deployment)
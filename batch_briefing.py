@@ -0,0 +1,95 @@
+"""
+Briefs for many patients at once, e.g. in a mass-casualty incident.
+
+Journals are extracted in parallel in the journal cache's process pool and
+each one is summarized on a bounded inference pool as soon as its text is
+ready. Results are yielded in completion order, one per patient, so a slow
+or broken journal delays or fails only its own brief.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from os import environ
+from typing import Dict, Iterator, List
+
+from dotenv import load_dotenv
+
+from journal_cache import journal_cache
+from patient_briefing import get_pdf_summary
+from patient_store import get_patient_store
+
+load_dotenv()
+
+# Summaries in flight for all batch requests together, so a batch cannot
+# take every slot of the shared inference pool used by interactive requests
+BATCH_INFERENCE_WORKERS = int(environ.get("BATCH_INFERENCE_WORKERS", 4))
+BATCH_MAX_PATIENTS = 50
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=BATCH_INFERENCE_WORKERS, thread_name_prefix="batch-brief")
+    return _executor
+
+
+def brief_patients(patient_ids: List[str], journals, include_text: bool = False) -> Iterator[Dict]:
+    """
+    Yield the brief of every patient as soon as it is ready.
+
+    Args:
+        patient_ids: Patient search keys, as returned by patient search
+        journals: Mapping of patient key to journal path (the patient index)
+        include_text: Include the full journal text in each result
+
+    Yields:
+        {"patient_id", "summary"[, "text"]} or {"patient_id", "error"} per
+        patient, in completion order
+    """
+    results = queue.Queue()
+    store = get_patient_store()
+
+    paths = {}
+    for patient_id in dict.fromkeys(patient_ids):
+        path = journals.get(patient_id)
+        if path is None:
+            yield {"patient_id": patient_id, "error": "Invalid patient_id"}
+        else:
+            paths[patient_id] = path
+
+    def summarize(patient_id, path, journal):
+        started = time.perf_counter()
+        record = store.get_for_journal(patient_id, path)
+        result = {"patient_id": patient_id, "summary": get_pdf_summary(journal.text, path, record)}
+        if include_text:
+            result["text"] = journal.text
+        result["summary_seconds"] = round(time.perf_counter() - started, 3)
+        return result
+
+    def summarized(future, patient_id):
+        try:
+            results.put(future.result())
+        except Exception as e:
+            results.put({"patient_id": patient_id, "error": str(e)})
+
+    def extracted(future, patient_id, path):
+        try:
+            journal = future.result()
+            get_executor().submit(summarize, patient_id, path, journal).add_done_callback(
+                lambda summary: summarized(summary, patient_id)
+            )
+        except Exception as e:
+            results.put({"patient_id": patient_id, "error": f"Could not read journal: {e}"})
+
+    futures = journal_cache.get_many(paths.values())
+    for patient_id, path in paths.items():
+        futures[path].add_done_callback(lambda future, patient_id=patient_id, path=path: extracted(future, patient_id, path))
+
+    for _ in paths:
+        yield results.get()
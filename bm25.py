@@ -0,0 +1,130 @@
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# NLTK stopword corpora, downloaded into ./corpora on first use if missing
+STOPWORDS_DIRECTORY = "corpora/stopwords"
+
+
+def _download_stopwords() -> None:
+    """Fetch the NLTK stopword corpora into ./corpora (only when missing)."""
+    try:
+        import nltk
+
+        nltk.download("stopwords", download_dir="./")
+    except Exception as e:
+        print(f"Could not download stopwords: {e}")
+
+
+def load_stopwords(languages: Iterable[str] = ("norwegian", "english")) -> Set[str]:
+    """
+    Read NLTK stopword lists from STOPWORDS_DIRECTORY.
+
+    Missing languages are skipped, so the index still works (without
+    stopword filtering) if the corpora cannot be downloaded.
+    """
+    if not os.path.isdir(STOPWORDS_DIRECTORY):
+        _download_stopwords()
+
+    stopwords = set()
+    for language in languages:
+        path = os.path.join(STOPWORDS_DIRECTORY, language)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                stopwords.update(line.strip() for line in f if line.strip())
+        except FileNotFoundError:
+            print(f"Stopword list not found: {path}")
+    return stopwords
+
+
+def tokenize(text: str, stopwords: Set[str] = frozenset()) -> List[str]:
+    """Lowercase word tokens without stopwords and single characters."""
+    return [
+        token for token in re.findall(r"\w+", text.lower())
+        if len(token) > 1 and token not in stopwords
+    ]
+
+
+class BM25Index:
+    """
+    In-memory inverted index with Okapi BM25 scoring.
+
+    Documents can be added and removed incrementally; collection statistics
+    (document count, average length, document frequencies) are kept up to date
+    so no rebuild is needed.
+    """
+
+    def __init__(self, stopwords: Optional[Set[str]] = None, k1: float = 1.5, b: float = 0.75):
+        self.stopwords = stopwords if stopwords is not None else load_stopwords()
+        self.k1 = k1
+        self.b = b
+        # term -> {doc_id: term frequency}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.documents: Dict[str, Tuple[str, dict]] = {}
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.doc_lengths
+
+    def add(self, doc_id: str, text: str, metadata: Optional[dict] = None) -> None:
+        """Index a document, replacing any previous version with the same id."""
+        if doc_id in self.doc_lengths:
+            self.remove(doc_id)
+
+        term_counts = Counter(tokenize(text, self.stopwords))
+        for term, count in term_counts.items():
+            self.postings.setdefault(term, {})[doc_id] = count
+
+        length = sum(term_counts.values())
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+        self.documents[doc_id] = (text, metadata or {})
+
+    def remove(self, doc_id: str) -> None:
+        """Remove a document from the index; unknown ids are ignored."""
+        if doc_id not in self.doc_lengths:
+            return
+
+        text, _ = self.documents.pop(doc_id)
+        for term in set(tokenize(text, self.stopwords)):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def search(self, query: str, n_results: int = 10) -> List[Tuple[str, float]]:
+        """
+        Score documents against the query.
+
+        Returns:
+            Up to n_results (doc_id, score) pairs, best first
+        """
+        n_docs = len(self.doc_lengths)
+        if n_docs == 0:
+            return []
+        avg_length = self.total_length / n_docs
+
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query, self.stopwords)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:n_results]
+
+    def get(self, doc_id: str) -> Tuple[str, dict]:
+        """Return the (text, metadata) stored for a document."""
+        return self.documents[doc_id]
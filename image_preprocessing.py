@@ -0,0 +1,220 @@
+"""
+Image preprocessing for vision requests.
+
+Images are downscaled to fit within a bounding box (keeping their aspect
+ratio), using JPEG draft mode and reduce() so large camera photos are never
+fully decoded, and re-encoded at the highest JPEG quality, capped at the
+quality the app used before, that keeps the payload under a target size.
+The images of a case are processed in a thread pool; Pillow releases the
+GIL while decoding and encoding.
+
+Usage (compares against a plain full-decode resize):
+    python image_preprocessing.py image.jpg [image.jpg ...]
+"""
+import io
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from os import environ
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MAX_IMAGE_SIZE = (512, 512)
+# Target size of an encoded image, before base64; a 512px camera photo is
+# about 10 KiB at quality 75, busier images get a lower quality to fit
+TARGET_PAYLOAD_BYTES = int(environ.get("IMAGE_TARGET_PAYLOAD_BYTES", 12 * 1024))
+MIN_JPEG_QUALITY = 50
+# Pillow's default, which the app used before; higher only grows the request
+MAX_JPEG_QUALITY = 75
+PREPROCESS_WORKERS = int(environ.get("IMAGE_PREPROCESS_WORKERS", 4))
+
+
+class PreprocessedImage:
+    """An encoded JPEG together with how it was produced."""
+
+    def __init__(self, data: bytes, size: Tuple[int, int], original_size: Tuple[int, int],
+                 quality: int, timings: Dict[str, float]):
+        self.data = data
+        self.size = size
+        self.original_size = original_size
+        self.quality = quality
+        # Seconds spent in each stage: decode, resize, encode
+        self.timings = timings
+
+    def report(self) -> str:
+        ms = ", ".join(f"{stage} {seconds * 1000:.1f}ms" for stage, seconds in self.timings.items())
+        return (
+            f"{self.original_size[0]}x{self.original_size[1]} -> {self.size[0]}x{self.size[1]}, "
+            f"q{self.quality}, {len(self.data) / 1024:.1f} KiB ({ms})"
+        )
+
+
+def fit_within(size: Tuple[int, int], max_size: Tuple[int, int]) -> Tuple[int, int]:
+    """Largest size with the same aspect ratio that fits in max_size (never upscales)."""
+    width, height = size
+    scale = min(max_size[0] / width, max_size[1] / height, 1.0)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _encode_jpeg(img, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def encode_to_target(img, target_bytes: int = TARGET_PAYLOAD_BYTES,
+                     min_quality: int = MIN_JPEG_QUALITY, max_quality: int = MAX_JPEG_QUALITY) -> Tuple[bytes, int]:
+    """
+    Encode at the highest quality whose output fits in target_bytes.
+
+    Binary-searches the quality; if even min_quality is too large, that
+    encoding is returned anyway.
+
+    Returns:
+        (jpeg bytes, quality)
+    """
+    data = _encode_jpeg(img, max_quality)
+    if len(data) <= target_bytes:
+        return data, max_quality
+
+    best, best_quality = None, None
+    low, high = min_quality, max_quality - 1
+    while low <= high:
+        quality = (low + high) // 2
+        candidate = _encode_jpeg(img, quality)
+        if len(candidate) <= target_bytes:
+            best, best_quality = candidate, quality
+            low = quality + 1
+        else:
+            high = quality - 1
+    if best is None:
+        return _encode_jpeg(img, min_quality), min_quality
+    return best, best_quality
+
+
+def preprocess_image(image_file, max_size: Tuple[int, int] = MAX_IMAGE_SIZE,
+                     target_bytes: int = TARGET_PAYLOAD_BYTES) -> PreprocessedImage:
+    """
+    Downscale an image to fit max_size and encode it as JPEG near target_bytes.
+
+    Args:
+        image_file: Binary file object positioned at the start of the image
+        max_size: Bounding box of the output; the aspect ratio is kept
+        target_bytes: Upper bound for the encoded size where quality allows
+    """
+    # Imported here so PIL is only loaded once an image is processed
+    from PIL import Image
+
+    started = time.perf_counter()
+    img = Image.open(image_file)
+    original_size = img.size
+    target = fit_within(original_size, max_size)
+    # JPEGs can be decoded at 1/2, 1/4 or 1/8 scale directly by the decoder
+    img.draft("RGB", target)
+    img.load()
+    decoded = time.perf_counter()
+
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    # Cheap integer box reduction first, then LANCZOS for the final step
+    factor = min(img.width // target[0], img.height // target[1])
+    if factor >= 2:
+        img = img.reduce(factor)
+    if img.size != target:
+        img = img.resize(target, Image.Resampling.LANCZOS)
+    resized = time.perf_counter()
+
+    data, quality = encode_to_target(img, target_bytes)
+    encoded = time.perf_counter()
+
+    return PreprocessedImage(
+        data, img.size, original_size, quality,
+        {"decode": decoded - started, "resize": resized - decoded, "encode": encoded - resized},
+    )
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Thread pool shared by all image preprocessing, created on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=PREPROCESS_WORKERS, thread_name_prefix="image-preprocess")
+    return _executor
+
+
+def map_images(function: Callable, images: Iterable) -> List:
+    """
+    Apply function to every image in the preprocessing pool, keeping order.
+
+    Exceptions are returned in place of results so one bad image does not
+    fail the whole case.
+    """
+    images = list(images)
+    if len(images) <= 1:
+        futures = None
+    else:
+        futures = [get_executor().submit(function, image) for image in images]
+
+    results = []
+    for idx, image in enumerate(images):
+        try:
+            results.append(futures[idx].result() if futures else function(image))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def _baseline(path: str, max_size: Tuple[int, int] = MAX_IMAGE_SIZE) -> Tuple[int, float]:
+    """Full decode and a direct LANCZOS resize at the default JPEG quality."""
+    from PIL import Image
+
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        img = Image.open(f).convert("RGB").resize(max_size, Image.Resampling.LANCZOS)
+    data = _encode_jpeg(img, 75)
+    return len(data), time.perf_counter() - started
+
+
+def main(paths: List[str]) -> None:
+    def run(path):
+        with open(path, "rb") as f:
+            return preprocess_image(f)
+
+    baseline_bytes, baseline_seconds = 0, 0.0
+    for path in paths:
+        size, seconds = _baseline(path)
+        baseline_bytes += size
+        baseline_seconds += seconds
+
+    started = time.perf_counter()
+    results = map_images(run, paths)
+    elapsed = time.perf_counter() - started
+
+    total_bytes = 0
+    for path, result in zip(paths, results):
+        if isinstance(result, Exception):
+            print(f"{path}: failed ({result})")
+            continue
+        total_bytes += len(result.data)
+        print(f"{path}: {result.report()}")
+    print(f"baseline:   {baseline_bytes / 1024:.1f} KiB in {baseline_seconds * 1000:.1f}ms (sequential)")
+    print(f"preprocess: {total_bytes / 1024:.1f} KiB in {elapsed * 1000:.1f}ms ({PREPROCESS_WORKERS} workers)")
+    if baseline_bytes and baseline_seconds:
+        print(f"saving:     {(1 - total_bytes / baseline_bytes) * 100:.0f}% of the payload, "
+              f"{(1 - elapsed / baseline_seconds) * 100:.0f}% of the time")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    main(sys.argv[1:])
@@ -0,0 +1,62 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from os import environ
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Set PERSIST_PATIENT_IMAGES=0 to keep captured and uploaded images in memory only
+PERSIST_PATIENT_IMAGES = environ.get("PERSIST_PATIENT_IMAGES", "1") == "1"
+
+
+class ImageWriteBehind:
+    """
+    Writes original images to disk in a background thread.
+
+    Requests hand over the image bytes and carry on; the file appears shortly
+    after. Files are written to a temporary name first and renamed, so readers
+    never see a partial image.
+    """
+
+    def __init__(self, enabled: bool = PERSIST_PATIENT_IMAGES):
+        self.enabled = enabled
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-store")
+        return self._executor
+
+    def persist(self, image_data, path: str) -> Optional[Future]:
+        """
+        Queue image_data (bytes or a buffer such as memoryview) to be written to path.
+
+        Returns:
+            A future for the write, or None when persistence is disabled
+        """
+        if not self.enabled:
+            return None
+        return self.executor.submit(self._write, image_data, path)
+
+    @staticmethod
+    def _write(image_data, path: str) -> None:
+        try:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(image_data)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Could not save image {path}: {e}")
+
+
+# Process-wide writer shared by the Streamlit app and the API
+image_store = ImageWriteBehind()
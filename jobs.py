@@ -0,0 +1,159 @@
+import itertools
+import queue
+import threading
+import time
+import uuid
+from os import environ
+from typing import Any, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Priority classes; lower values run first
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+DEFAULT_PRIORITY = "normal"
+
+JOB_WORKERS = int(environ.get("JOB_WORKERS", 4))
+# Queued jobs beyond this are rejected instead of piling up
+JOB_QUEUE_MAX = int(environ.get("JOB_QUEUE_MAX", 256))
+# Finished jobs are kept this long for clients to fetch their result
+JOB_RESULT_TTL_SECONDS = 15 * 60
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while JOB_QUEUE_MAX jobs are waiting."""
+
+
+class Job:
+    """A unit of work with its status and, once finished, its result or error."""
+
+    def __init__(self, kind: str, function: Callable[[], Any], priority: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.priority = priority
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._function = function
+        self._done = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def to_dict(self) -> Dict:
+        job = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "priority": self.priority,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.status == "succeeded":
+            job["result"] = self.result
+        elif self.status == "failed":
+            job["error"] = self.error
+        return job
+
+
+class JobQueue:
+    """
+    In-process job queue with a bounded worker pool and priority classes.
+
+    Slow work (PDF parsing, LLM calls) runs on JOB_WORKERS threads, so web
+    workers return immediately with a job id and stay free for cheap
+    requests. High-priority jobs are picked before normal and low ones;
+    jobs of the same class run in submission order.
+
+    Jobs and their results exist only in the memory of the process that
+    queued them. The API must therefore run as one process with threaded
+    workers (e.g. `gunicorn --workers 1 --threads 8 api:app`); with several
+    worker processes a poll for a job lands on the wrong one and gets 404.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_queued: int = JOB_QUEUE_MAX,
+                 result_ttl_seconds: float = JOB_RESULT_TTL_SECONDS):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.result_ttl_seconds = result_ttl_seconds
+        self._queue = queue.PriorityQueue()
+        self._jobs: Dict[str, Job] = {}
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _start_workers(self) -> None:
+        # Called with self._lock held
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, kind: str, function: Callable[[], Any], priority: str = DEFAULT_PRIORITY) -> Job:
+        """
+        Queue a zero-argument callable.
+
+        Raises:
+            ValueError: For an unknown priority class
+            QueueFull: If max_queued jobs are already waiting
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r}; use one of {', '.join(PRIORITIES)}")
+        job = Job(kind, function, priority)
+        with self._lock:
+            self._expire()
+            if self._queue.qsize() >= self.max_queued:
+                raise QueueFull(f"{self._queue.qsize()} jobs are already queued")
+            self._start_workers()
+            self._jobs[job.id] = job
+            self._queue.put((PRIORITIES[priority], next(self._sequence), job))
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.result_ttl_seconds
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def _work(self) -> None:
+        while True:
+            _, _, job = self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                job.result = job._function()
+                job.status = "succeeded"
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+            finally:
+                job.finished_at = time.time()
+                job._function = None
+                job._done.set()
+                self._queue.task_done()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = {"queued": 0, "running": 0, "succeeded": 0, "failed": 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return {"workers": self.workers, "max_queued": self.max_queued, **counts}
+
+
+# Process-wide queue used by the API
+job_queue = JobQueue()
@@ -0,0 +1,229 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import zlib
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+JOURNALS_DIRECTORY = "data/journals"
+JOURNAL_CACHE_DIRECTORY = ".cache/journal_text"
+# Processes extracting PDFs for batch loads; PyPDF2 is pure Python, so threads would serialize on the GIL
+PDF_EXTRACT_PROCESSES = int(os.environ.get("PDF_EXTRACT_PROCESSES", min(4, os.cpu_count() or 1)))
+
+
+class JournalText:
+    """Extracted journal text with the start offset of every page."""
+
+    def __init__(self, text: str, page_offsets: List[int]):
+        self.text = text
+        self.page_offsets = page_offsets
+
+    def __len__(self):
+        return len(self.page_offsets)
+
+    def page(self, index: int) -> str:
+        """Text of a single page (0-based), including its trailing newline."""
+        start = self.page_offsets[index]
+        end = self.page_offsets[index + 1] if index + 1 < len(self.page_offsets) else len(self.text)
+        return self.text[start:end]
+
+
+def extract_journal_text(pdf_file) -> JournalText:
+    """Run PyPDF2 over a journal, recording where each page starts."""
+    # Imported here so only a cache miss pays for loading PyPDF2
+    import PyPDF2
+
+    pdf_reader = PyPDF2.PdfReader(pdf_file)
+    pages = []
+    page_offsets = []
+    offset = 0
+    for page in pdf_reader.pages:
+        page_text = page.extract_text() + "\n"
+        page_offsets.append(offset)
+        pages.append(page_text)
+        offset += len(page_text)
+    return JournalText("".join(pages), page_offsets)
+
+
+def extract_text_from_pdf(pdf_file) -> str:
+    return extract_journal_text(pdf_file).text
+
+
+def _extract_journal_file(path: str) -> JournalText:
+    with open(path, "rb") as pdf_file:
+        return extract_journal_text(pdf_file)
+
+
+_extract_pool = None
+_extract_pool_lock = threading.Lock()
+
+
+def get_extract_pool() -> ProcessPoolExecutor:
+    """Process pool for PDF extraction, created on first use."""
+    global _extract_pool
+    if _extract_pool is None:
+        with _extract_pool_lock:
+            if _extract_pool is None:
+                # Forking copies the locks of the server's threads, possibly held;
+                # spawned workers start clean, but re-run the main script as
+                # __mp_main__, which must then skip its startup work (see api.py)
+                _extract_pool = ProcessPoolExecutor(
+                    max_workers=PDF_EXTRACT_PROCESSES, mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _extract_pool
+
+
+class JournalTextCache:
+    """
+    Disk-backed cache of extracted journal text.
+
+    Entries are keyed by the journal's path, mtime and size, so an edited or
+    replaced PDF is re-extracted automatically. Each entry is stored as
+    zlib-compressed JSON next to an in-memory copy for the hot path.
+    """
+
+    def __init__(self, directory: str = JOURNAL_CACHE_DIRECTORY):
+        self.directory = directory
+        self._memory: Dict[tuple, JournalText] = {}
+        self._lock = threading.Lock()
+        self._warm_up_thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _key(path: str) -> tuple:
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+    def _entry_path(self, abs_path: str) -> str:
+        name = hashlib.sha1(abs_path.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{name}.json.z")
+
+    def _read_entry(self, key: tuple) -> Optional[JournalText]:
+        abs_path, mtime_ns, size = key
+        try:
+            with open(self._entry_path(abs_path), "rb") as f:
+                entry = json.loads(zlib.decompress(f.read()).decode("utf-8"))
+        except (FileNotFoundError, zlib.error, ValueError):
+            return None
+        if entry.get("mtime_ns") != mtime_ns or entry.get("size") != size:
+            return None
+        return JournalText(entry["text"], entry["page_offsets"])
+
+    def _write_entry(self, key: tuple, journal: JournalText) -> None:
+        abs_path, mtime_ns, size = key
+        os.makedirs(self.directory, exist_ok=True)
+        data = zlib.compress(json.dumps({
+            "path": abs_path,
+            "mtime_ns": mtime_ns,
+            "size": size,
+            "page_offsets": journal.page_offsets,
+            "text": journal.text,
+        }).encode("utf-8"))
+        entry_path = self._entry_path(abs_path)
+        # Write to a temporary file first so readers never see a partial entry
+        tmp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, entry_path)
+
+    def get(self, path: str) -> JournalText:
+        """Return the journal's text, extracting it with PyPDF2 only on a cache miss."""
+        key = self._key(path)
+        journal = self._memory.get(key)
+        if journal is not None:
+            return journal
+
+        journal = self._read_entry(key)
+        if journal is None:
+            journal = _extract_journal_file(path)
+            self._write_entry(key, journal)
+        self._remember(key, journal)
+        return journal
+
+    def _remember(self, key: tuple, journal: JournalText) -> None:
+        with self._lock:
+            # Drop entries for older versions of the same file
+            for stale_key in [k for k in self._memory if k[0] == key[0]]:
+                del self._memory[stale_key]
+            self._memory[key] = journal
+
+    def get_many(self, paths: Iterable[str]) -> Dict[str, Future]:
+        """
+        Start loading several journals at once.
+
+        Cached journals are returned as completed futures; the others are
+        extracted in parallel in the process pool and cached as they finish.
+
+        Returns:
+            path -> Future of its JournalText (or of the error loading it)
+        """
+        futures = {}
+        for path in paths:
+            future = futures[path] = Future()
+            try:
+                key = self._key(path)
+                journal = self._memory.get(key) or self._read_entry(key)
+            except OSError as e:
+                future.set_exception(e)
+                continue
+            if journal is not None:
+                self._remember(key, journal)
+                future.set_result(journal)
+                continue
+
+            def extracted(extraction, key=key, future=future):
+                try:
+                    journal = extraction.result()
+                    self._write_entry(key, journal)
+                    self._remember(key, journal)
+                    future.set_result(journal)
+                except Exception as e:
+                    future.set_exception(e)
+
+            try:
+                get_extract_pool().submit(_extract_journal_file, path).add_done_callback(extracted)
+            except Exception as e:
+                # e.g. a broken process pool
+                future.set_exception(e)
+        return futures
+
+    def get_text(self, path: str) -> str:
+        return self.get(path).text
+
+    def warm_up(self, directory: str = JOURNALS_DIRECTORY, background: bool = True) -> Optional[threading.Thread]:
+        """
+        Fill the cache for every PDF in a directory.
+
+        Runs once per process in a daemon thread by default; later calls
+        return the running (or finished) thread.
+        """
+        with self._lock:
+            if self._warm_up_thread is not None:
+                return self._warm_up_thread
+            self._warm_up_thread = threading.Thread(
+                target=self._warm_up, args=(directory,), daemon=True
+            )
+        if background:
+            self._warm_up_thread.start()
+        else:
+            self._warm_up_thread.run()
+        return self._warm_up_thread
+
+    def _warm_up(self, directory: str) -> None:
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith(".pdf"):
+                continue
+            try:
+                self.get(os.path.join(directory, filename))
+            except Exception as e:
+                print(f"Could not cache journal text for {filename}: {e}")
+
+
+# Process-wide cache shared by the Streamlit app and the API
+journal_cache = JournalTextCache()
+
+
+def get_journal_text(path: str) -> str:
+    """Text of the journal PDF at path, served from the journal text cache."""
+    return journal_cache.get_text(path)
@@ -0,0 +1,233 @@
+"""
+Condensed patient history for prompts.
+
+Parses journal text into per-visit records and renders a compact history
+within a token budget: the demographics, every distinct diagnosis with its
+first and last visit, the latest vital signs, and the visits themselves,
+most recent first and with less detail as they get older. Repeated
+follow-up visits are collapsed so they do not crowd out the diagnoses.
+
+Two journal layouts are understood: the one PatientJournalGenerator emits
+("Besøksdato:", "Tilstand:", "Behandling:", "Vitale tegn:", "Notater:") and
+the chronological layout with "**YYYY-MM-DD:**" items and Syst./Obj./Vurd./
+Plan. fields.
+"""
+import re
+from typing import Dict, List, Tuple
+
+# Rough token estimate for Norwegian and English text
+CHARS_PER_TOKEN = 4
+CONDENSED_HISTORY_TOKENS = 600
+# The most recent visits keep their notes; older ones are reduced to a line
+DETAILED_VISITS = 3
+NOTE_MAX_CHARS = 240
+
+DATE_PATTERN = r"\d{4}-\d{2}-\d{2}"
+GENERATOR_VISIT = re.compile(rf"^Besøksdato:\s*({DATE_PATTERN})", re.MULTILINE)
+CHRONOLOGICAL_VISIT = re.compile(
+    rf"^\s*(?:\d+\.|-)?\s*\*\*(?:[^*\n]*?:\s*)?({DATE_PATTERN})[^*\n]*\*\*:?", re.MULTILINE
+)
+GENERATOR_FIELDS = {
+    "Tilstand": "condition",
+    "Behandling": "treatment",
+    "Vitale tegn": "vitals",
+    "Notater": "notes",
+}
+CHRONOLOGICAL_FIELDS = {
+    "Syst.": "symptoms",
+    "Obj.": "vitals",
+    "Vurd.": "condition",
+    "Plan": "treatment",
+}
+VITAL_PATTERNS = {
+    "BP": re.compile(r"(?:Blodtrykk|BP)\s*:?\s*(\d{2,3}/\d{2,3})", re.IGNORECASE),
+    "HR": re.compile(r"(?:Hjertefrekvens|puls)\s*:?\s*(\d{2,3})", re.IGNORECASE),
+    "Temp": re.compile(r"(?:Temperatur|temp(?:eratur)?)\s*:?\s*(\d{2}[.,]\d)\s*°?C?", re.IGNORECASE),
+}
+FOLLOW_UP_SUFFIX = re.compile(r"\s*[-–]\s*oppfølging$", re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _clean(text: str) -> str:
+    """Drop markdown emphasis and join wrapped lines."""
+    return " ".join(text.replace("**", "").split())
+
+
+class Visit:
+    """One journal entry: date, condition (diagnosis), treatment, vital signs and notes."""
+
+    def __init__(self, date: str, fields: Dict[str, str], text: str = ""):
+        self.date = date
+        self.text = text
+        self.condition = _clean(fields.get("condition", ""))
+        self.treatment = _clean(fields.get("treatment", ""))
+        self.symptoms = _clean(fields.get("symptoms", ""))
+        self.notes = _clean(fields.get("notes", ""))
+        # Free-text entries mention vital signs in their notes
+        raw_vitals = fields.get("vitals") or fields.get("notes", "")
+        self.vitals = {
+            name: match.group(1).replace(",", ".")
+            for name, pattern in VITAL_PATTERNS.items()
+            for match in [pattern.search(raw_vitals)] if match
+        }
+
+    @property
+    def diagnosis(self) -> str:
+        """The condition without a trailing "- Oppfølging" (follow-up) marker."""
+        return FOLLOW_UP_SUFFIX.sub("", self.condition.rstrip(".")).strip()
+
+    def signature(self) -> Tuple[str, str, str]:
+        """Visits with the same signature repeat each other (e.g. routine follow-ups)."""
+        return self.diagnosis.lower(), self.treatment.lower(), re.sub(r"\d", "", self.notes.lower())
+
+    def render(self, detailed: bool) -> str:
+        parts = [part for part in (self.condition, self.treatment) if part]
+        note = self.notes or self.symptoms
+        # Entries that are only free text keep a shortened note even when not detailed
+        if note and (detailed or not parts):
+            max_chars = NOTE_MAX_CHARS if detailed else NOTE_MAX_CHARS // 2
+            parts.append(note if len(note) <= max_chars else note[:max_chars].rsplit(" ", 1)[0] + "...")
+        if detailed:
+            if self.vitals:
+                parts.append(", ".join(f"{name} {value}" for name, value in self.vitals.items()))
+        return f"- {self.date}: " + "; ".join(parts)
+
+
+def _split_fields(body: str, labels: Dict[str, str], first_field: str) -> Dict[str, str]:
+    """Split a visit's text into fields by label; text before the first label goes to first_field."""
+    label_pattern = re.compile(
+        r"^\s*-?\s*\*{0,2}(" + "|".join(re.escape(label) for label in labels) + r")\*{0,2}:?\*{0,2}:?",
+        re.MULTILINE,
+    )
+    fields: Dict[str, str] = {}
+    matches = list(label_pattern.finditer(body))
+    lead = body[:matches[0].start()] if matches else body
+    if lead.strip():
+        fields[first_field] = lead
+    for match, next_match in zip(matches, matches[1:] + [None]):
+        end = next_match.start() if next_match else len(body)
+        name = labels[match.group(1)]
+        fields[name] = (fields.get(name, "") + " " + body[match.end():end]).strip()
+    return fields
+
+
+def parse_journal(text: str) -> Tuple[str, List[Visit]]:
+    """
+    Split journal text into its header (demographics) and visits, oldest first.
+
+    Returns:
+        (header, visits); visits is empty if the layout is not recognized
+    """
+    for pattern, labels, first_field in (
+        (GENERATOR_VISIT, GENERATOR_FIELDS, "notes"),
+        (CHRONOLOGICAL_VISIT, CHRONOLOGICAL_FIELDS, "notes"),
+    ):
+        starts = list(pattern.finditer(text))
+        if not starts:
+            continue
+        header = text[:starts[0].start()]
+        visits = []
+        for match, next_match in zip(starts, starts[1:] + [None]):
+            body = text[match.end():next_match.start() if next_match else len(text)]
+            # Section headings of the next part belong to neither visit
+            body = re.split(r"^\*\*[^*\n]+:\*\*\s*$", body, flags=re.MULTILINE)[0]
+            visit = Visit(match.group(1), _split_fields(body, labels, first_field))
+            # The entry as written, for retrieval over the journal
+            visit.text = _clean(match.group(0) + body)
+            visits.append(visit)
+        visits.sort(key=lambda visit: visit.date)
+        return header, visits
+    return text, []
+
+
+def header_lines(header: str) -> List[str]:
+    """Demographic fields of a journal header, with wrapped lines joined."""
+    lines = []
+    for raw_line in header.splitlines():
+        line = _clean(raw_line).lstrip("- ")
+        if not line:
+            continue
+        if ":" not in line:
+            # Continuation of a wrapped field when indented or mid-sentence;
+            # other lines are titles ("Besøkshistorikk")
+            wrapped = raw_line[:1].isspace() or line[:1].islower()
+            if lines and wrapped and not raw_line.lstrip().startswith(("-", "*")):
+                lines[-1] += " " + line
+            continue
+        # Section headings carry no patient information
+        if not line.endswith(":"):
+            lines.append(line)
+    return lines
+
+
+def _diagnoses(visits: List[Visit]) -> List[str]:
+    """Distinct diagnoses, most recently seen first, with their date range and visit count."""
+    seen: Dict[str, List] = {}
+    for visit in visits:
+        diagnosis = visit.diagnosis
+        if not diagnosis:
+            continue
+        entry = seen.setdefault(diagnosis.lower(), [diagnosis, visit.date, visit.date, 0])
+        entry[2] = visit.date
+        entry[3] += 1
+    lines = []
+    for diagnosis, first, last, count in sorted(seen.values(), key=lambda entry: entry[2], reverse=True):
+        span = first if first == last else f"{first} to {last}"
+        lines.append(f"- {diagnosis} ({span}, {count} visit{'s' if count > 1 else ''})")
+    return lines
+
+
+def condense_journal(text: str, max_tokens: int = CONDENSED_HISTORY_TOKENS) -> str:
+    """
+    Condensed medical history of a journal within roughly max_tokens.
+
+    Falls back to the start of the journal, cut at max_tokens, when no
+    visits can be parsed.
+    """
+    header, visits = parse_journal(text)
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if not visits:
+        return text if len(text) <= max_chars else text[:max_chars].rsplit(" ", 1)[0] + "..."
+
+    sections = []
+    patient_lines = header_lines(header)
+    if patient_lines:
+        sections.append("Patient:\n" + "\n".join(f"- {line}" for line in patient_lines))
+    diagnosis_lines = _diagnoses(visits)
+    if diagnosis_lines:
+        sections.append("Diagnoses (most recent first):\n" + "\n".join(diagnosis_lines))
+    latest_vitals = next((visit for visit in reversed(visits) if visit.vitals), None)
+    if latest_vitals is not None:
+        vitals = ", ".join(f"{name} {value}" for name, value in latest_vitals.vitals.items())
+        sections.append(f"Latest vital signs ({latest_vitals.date}): {vitals}")
+
+    condensed = "\n\n".join(sections)
+    # Diagnoses are kept even over budget; visits fill whatever is left
+    budget = max_chars - len(condensed) - len("\n\nVisits (most recent first):")
+    visit_lines = []
+    seen_signatures = set()
+    omitted = 0
+    for rank, visit in enumerate(reversed(visits)):
+        signature = visit.signature()
+        if signature in seen_signatures:
+            omitted += 1
+            continue
+        seen_signatures.add(signature)
+        if not any(signature):
+            continue
+        line = visit.render(detailed=rank < DETAILED_VISITS)
+        if len(line) + 1 > budget:
+            omitted += 1
+            continue
+        visit_lines.append(line)
+        budget -= len(line) + 1
+
+    if visit_lines:
+        condensed += "\n\nVisits (most recent first):\n" + "\n".join(visit_lines)
+    if omitted:
+        condensed += f"\n({omitted} repeated or older visits omitted)"
+    return condensed
+
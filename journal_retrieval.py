@@ -0,0 +1,139 @@
+"""
+Retrieval over a patient's own journal for chat questions.
+
+The journal is split into one chunk per visit (or into passages when its
+layout is not recognized). Each question is answered from the demographics
+plus the top-k chunks, so the prompt stays the same size however long the
+patient's history is. Chunks are ranked by BM25 and, once the FHI engine has
+loaded it, by the same all-MiniLM-L6-v2 embedding function, fused with
+reciprocal rank fusion. Indexes are built on the first question and cached
+per journal.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List
+
+from bm25 import BM25Index, load_stopwords
+from journal_condenser import header_lines, parse_journal
+from rag_fhi import RRF_K, CHUNK_MAX_CHARS, get_shared_fhi_recommendations, split_into_passages
+
+# Chunks placed in the prompt per question
+JOURNAL_TOP_K = 4
+# Journals whose indexes are kept in memory
+JOURNAL_INDEX_CACHE_SIZE = 32
+
+_stopwords = None
+
+
+def _shared_stopwords():
+    global _stopwords
+    if _stopwords is None:
+        _stopwords = load_stopwords()
+    return _stopwords
+
+
+class JournalIndex:
+    """Chunks of one journal with a BM25 index and, when available, their embeddings."""
+
+    def __init__(self, text: str):
+        header, visits = parse_journal(text)
+        self.header_lines = header_lines(header) if visits else []
+        if visits:
+            # Newest first, so ties in ranking favour recent visits
+            self.chunks = [
+                visit.text if len(visit.text) <= CHUNK_MAX_CHARS else visit.text[:CHUNK_MAX_CHARS].rsplit(" ", 1)[0] + "..."
+                for visit in reversed(visits)
+            ]
+        else:
+            self.chunks = split_into_passages(text.replace("\n", " "))
+
+        self.lexical_index = BM25Index(stopwords=_shared_stopwords())
+        for i, chunk in enumerate(self.chunks):
+            self.lexical_index.add(str(i), chunk)
+        self.embeddings = None
+        self._lock = threading.Lock()
+
+    def _embed_chunks(self, embedding_function):
+        with self._lock:
+            if self.embeddings is None and self.chunks:
+                import numpy as np
+
+                vectors = np.asarray(embedding_function(self.chunks), dtype=np.float32)
+                self.embeddings = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        return self.embeddings
+
+    def _vector_search(self, embedding_function, question: str, n_results: int) -> List[int]:
+        import numpy as np
+
+        embeddings = self._embed_chunks(embedding_function)
+        query = np.asarray(embedding_function([question])[0], dtype=np.float32)
+        similarities = embeddings @ (query / np.linalg.norm(query))
+        return [int(chunk_id) for chunk_id in np.argsort(-similarities)[:n_results]]
+
+    def search(self, question: str, k: int = JOURNAL_TOP_K) -> List[int]:
+        """Indexes of the k chunks most relevant to the question."""
+        if len(self.chunks) <= k:
+            return list(range(len(self.chunks)))
+
+        scores = {}
+        for rank, (chunk_id, _) in enumerate(self.lexical_index.search(question, n_results=k * 2)):
+            scores[int(chunk_id)] = scores.get(int(chunk_id), 0.0) + 1.0 / (RRF_K + rank + 1)
+
+        rag = get_shared_fhi_recommendations()
+        if not rag.is_ready:
+            # Load the model in the background; BM25 answers until then
+            rag.start_background_init()
+        else:
+            try:
+                for rank, chunk_id in enumerate(self._vector_search(rag.embedding_function, question, k * 2)):
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+            except Exception as e:
+                print(f"Vector search over journal failed, using BM25 only: {e}")
+
+        # Recent visits first when nothing matches the question
+        for chunk_id in range(k):
+            scores.setdefault(chunk_id, 0.0)
+        return sorted(scores, key=lambda chunk_id: (-scores[chunk_id], chunk_id))[:k]
+
+    def context(self, question: str, k: int = JOURNAL_TOP_K) -> str:
+        """Demographics and the relevant journal entries, oldest first."""
+        selected = sorted(self.search(question, k), reverse=True)
+        parts = []
+        if self.header_lines:
+            parts.append("\n".join(f"- {line}" for line in self.header_lines))
+        parts.extend(self.chunks[i] for i in selected)
+        return "\n\n".join(parts)
+
+
+_indexes: "OrderedDict[str, JournalIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_journal_index(text: str) -> JournalIndex:
+    """Index of a journal's text, cached by content for the most recent journals."""
+    key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+
+    index = JournalIndex(text)
+    with _indexes_lock:
+        _indexes[key] = index
+        while len(_indexes) > JOURNAL_INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+
+def get_relevant_journal_context(text: str, question: str, k: int = JOURNAL_TOP_K) -> str:
+    """
+    The parts of a journal relevant to a question, for use in a prompt.
+
+    Args:
+        text: Full journal text
+        question: The user's question
+        k: Number of journal entries to include
+    """
+    return get_journal_index(text).context(question, k)
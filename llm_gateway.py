@@ -0,0 +1,241 @@
+import bisect
+import random
+import threading
+import time
+from os import environ
+from typing import Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Overridable with NEBIUS_BASE_URL so the gateway can be pointed at a local fake server
+NEBIUS_BASE_URL = "https://api.studio.nebius.ai/v1/"
+
+# Request timeouts in seconds; larger models and image payloads get more time
+MODEL_TIMEOUTS = {
+    "meta-llama/Llama-3.3-70B-Instruct": 120.0,
+    "meta-llama/Llama-3.3-70B-Instruct-fast": 60.0,
+    "llava-hf/llava-1.5-7b-hf": 90.0,
+}
+DEFAULT_TIMEOUT = 60.0
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = [0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf")]
+
+
+class TokenBucket:
+    """Token-bucket rate limiter: `rate` requests per second with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a token is available, then take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class GatewayStats:
+    """Thread-safe counters and latency histogram of the gateway."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.queued = 0
+        self.requests = 0
+        self.retried = 0
+        self.failed = 0
+        self.latency_counts = [0] * len(LATENCY_BUCKETS)
+        self.latency_total = 0.0
+
+    def add(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def observe_latency(self, seconds: float) -> None:
+        with self._lock:
+            self.latency_counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            self.latency_total += seconds
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            completed = sum(self.latency_counts)
+            return {
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "requests": self.requests,
+                "retried": self.retried,
+                "failed": self.failed,
+                "latency_histogram": {
+                    ("+Inf" if bound == float("inf") else str(bound)): count
+                    for bound, count in zip(LATENCY_BUCKETS, self.latency_counts)
+                },
+                "latency_avg": self.latency_total / completed if completed else None,
+            }
+
+
+class LLMGateway:
+    """
+    Single entry point for chat completions against the OpenAI-compatible endpoint.
+
+    Owns one OpenAI client with a tuned HTTP connection pool, and wraps every
+    request in a token-bucket rate limiter, a concurrency bound, per-model
+    timeouts and retries with exponential backoff and full jitter.
+
+    Settings not passed in are read from the environment when the gateway is
+    created (NEBIUS_BASE_URL, NEBIUS_API_KEY, LLM_MAX_CONCURRENCY,
+    LLM_RATE_PER_SECOND, LLM_BURST, LLM_MAX_RETRIES).
+    """
+
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None,
+                 max_concurrency: Optional[int] = None, rate_per_second: Optional[float] = None,
+                 burst: Optional[int] = None, max_retries: Optional[int] = None,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0):
+        if max_concurrency is None:
+            max_concurrency = int(environ.get("LLM_MAX_CONCURRENCY", 8))
+        if rate_per_second is None:
+            rate_per_second = float(environ.get("LLM_RATE_PER_SECOND", 5))
+        if burst is None:
+            burst = int(environ.get("LLM_BURST", 10))
+        if max_retries is None:
+            max_retries = int(environ.get("LLM_MAX_RETRIES", 4))
+        self.base_url = base_url if base_url is not None else environ.get("NEBIUS_BASE_URL", NEBIUS_BASE_URL)
+        self.api_key = api_key if api_key is not None else environ.get("NEBIUS_API_KEY")
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = TokenBucket(rate_per_second, burst)
+        self.stats = GatewayStats()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        """The OpenAI client, created on first use."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    assert self.api_key is not None, "NEBIUS_API_KEY is not set"
+                    import httpx
+                    from openai import DefaultHttpxClient, OpenAI
+
+                    self._client = OpenAI(
+                        base_url=self.base_url,
+                        api_key=self.api_key,
+                        # Retries are handled here, with backoff and statistics
+                        max_retries=0,
+                        http_client=DefaultHttpxClient(
+                            limits=httpx.Limits(
+                                max_connections=self.max_concurrency * 2,
+                                max_keepalive_connections=self.max_concurrency,
+                                keepalive_expiry=60,
+                            ),
+                            timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=5.0),
+                        ),
+                    )
+        return self._client
+
+    def _is_retryable(self, error: Exception) -> bool:
+        import openai
+
+        if isinstance(error, (openai.RateLimitError, openai.APITimeoutError,
+                              openai.APIConnectionError, openai.InternalServerError)):
+            return True
+        return isinstance(error, openai.APIStatusError) and error.status_code in (408, 409, 429)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        # Honor Retry-After when the server sends one
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _acquire(self) -> None:
+        """Wait for the rate limiter and a concurrency slot."""
+        self.stats.add("queued")
+        try:
+            self.rate_limiter.acquire()
+            self._slots.acquire()
+        finally:
+            self.stats.add("queued", -1)
+        self.stats.add("in_flight")
+
+    def _release(self) -> None:
+        self.stats.add("in_flight", -1)
+        self._slots.release()
+
+    def _create(self, model: str, messages: List[Dict], **params):
+        """Issue a request, retrying transient failures."""
+        params.setdefault("timeout", MODEL_TIMEOUTS.get(model, DEFAULT_TIMEOUT))
+        attempt = 0
+        while True:
+            self._acquire()
+            started = time.monotonic()
+            self.stats.add("requests")
+            try:
+                result = self.client.chat.completions.create(model=model, messages=messages, **params)
+                if not params.get("stream"):
+                    self.stats.observe_latency(time.monotonic() - started)
+                    self._release()
+                # Streams keep their slot until fully consumed
+                return result, started
+            except Exception as e:
+                self._release()
+                if attempt >= self.max_retries or not self._is_retryable(e):
+                    self.stats.add("failed")
+                    raise
+                self.stats.add("retried")
+                time.sleep(self._backoff(attempt, e))
+                attempt += 1
+
+    def chat_completion(self, model: str, messages: List[Dict], **params):
+        """Create a chat completion; params are passed to the OpenAI client."""
+        completion, _ = self._create(model, messages, **params)
+        return completion
+
+    def chat_completion_stream(self, model: str, messages: List[Dict], **params) -> Iterator[str]:
+        """Create a streaming chat completion and yield its text as it arrives."""
+        stream, started = self._create(model, messages, stream=True, **params)
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+            self.stats.observe_latency(time.monotonic() - started)
+        except Exception:
+            self.stats.add("failed")
+            raise
+        finally:
+            self._release()
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> LLMGateway:
+    """Return the process-wide gateway shared by text and vision inference."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+    return _gateway
@@ -1,14 +1,20 @@
-import nltk 
-nltk.download("stopwords", download_dir="./")
 import streamlit as st
-import PyPDF2
+import hashlib
 from io import BytesIO
-from nebius_inference import inference
+from nebius_inference import inference_stream, executor, run_concurrently, warm_up
 import os
 from datetime import datetime
-from fuzzywuzzy import fuzz
-from nebius_vision import vision_inference
-from rag_fhi import FHI_recommendations
+from nebius_vision import encode_image, vision_inference_stream
+from rag_fhi import get_shared_fhi_recommendations
+from patient_registry import get_patient_registry
+from patient_store import get_patient_store
+from journal_cache import journal_cache
+from journal_condenser import condense_journal
+from journal_retrieval import get_relevant_journal_context
+from answer_cache import answer_cache, answer_scope
+from image_store import image_store
+from patient_briefing import get_call_log_recommendations, get_journal_summary, get_patient_log_summary
+from prefetch import get_prefetcher
 from tts import text_to_speech, generate_audio
 
 # ------------------------------
@@ -65,43 +71,13 @@ st.markdown(
 # 2. HELPER FUNCTIONS
 # ------------------------------
 
-def extract_text_from_pdf(pdf_file):
-    pdf_reader = PyPDF2.PdfReader(pdf_file)
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text() + "\n"
-    return text
-
-def get_journal_summary(text):
-    prompt = f"""This is a patient journal, showing the medical history of the patient. Return 3 main points that are most relevant to the patient's health, for emergency responders to know.
-{text}
-
-Please make the summary concise but include all important points.
-Only return the summary, no other text."""
-    return inference(prompt)
-
-def get_patient_log_summary(patient_info):
-    """Given patient name - personal number, retrieve summary of emergency call log."""
-    try:
-        log_path = os.path.join("data", "emergency_call_logs", f"{patient_info}.txt")
-        log_text = open(log_path, "r").read()
-    except FileNotFoundError:
-        return "No previous emergency calls recorded for this patient."
-    except Exception as e:
-        print(f"Error reading emergency log: {e}")
-        return "Unable to retrieve emergency call history."
-
-    prompt = f"""This is an emergency call log, showing the patient's emergency call history. Return 3 main points that are most relevant to the patient's health, for emergency responders to know.
-{log_text}
-
-Please make the summary concise but include all important points.
-Only return the summary, no other text."""
-    return inference(prompt)
-
-def get_document_response(text, question, images=None):
+def stream_document_response(text, question, images=None):
+    """Yield the answer to a question about the journal as it is generated."""
+    # Only the journal entries relevant to the question, so the prompt size stays constant
+    journal_context = get_relevant_journal_context(text, question)
     base_prompt = f"""
-    This is a patient journal, showing the medical history of the patient. Use this information if relevant when answering questions.
-    {text}
+    These are excerpts from a patient journal, showing the medical history of the patient. Use this information if relevant when answering questions.
+    {journal_context}
 
     The ambulance crew has also included the following information: {st.session_state.additional_info}
     Please answer this question: {question}
@@ -110,67 +86,39 @@ def get_document_response(text, question, images=None):
     Provide a concise answer.
     """
     if images:
+        started = False
         try:
-            import tempfile
-
-            temp_dir = tempfile.gettempdir()
-            image_paths = []
-            for idx, image in enumerate(images):
-                temp_path = os.path.join(temp_dir, f"temp_image_{idx}.jpg")
-                with open(temp_path, "wb") as f:
-                    f.write(image.getbuffer())
-                image_paths.append(temp_path)
-
-            # Use vision inference when images are present
-            response = vision_inference(image_paths, base_prompt)
-
-            # Clean up temporary files
-            for path in image_paths:
-                try:
-                    os.remove(path)
-                except Exception as e:
-                    print(f"Error removing temporary file {path}: {e}")
-
-            return response
+            # Images are passed as in-memory buffers, no temporary files involved
+            for token in vision_inference_stream(list(images), base_prompt):
+                started = True
+                yield token
+            return
         except Exception as e:
+            if started:
+                raise
             st.error(f"Error processing images: {e}")
-            # Fallback to text-only response
-            return inference(base_prompt)
-    else:
-        # Regular text-only inference
-        return inference(base_prompt)
-
-def load_patient_journals():
-    journals_dir = "data/journals"
-    journals = {}
-    for filename in os.listdir(journals_dir):
-        if filename.endswith(".pdf"):
-            try:
-                if " - " in filename:
-                    # Original format: "Ola Hansen - 120384 12345.pdf"
-                    name_part, numbers = filename.replace(".pdf", "").split(" - ")
-                    dob, personal_number = numbers.split(" ")
-                    search_string = f"{name_part.lower()} {dob} {personal_number}"
-                else:
-                    # New format: "patient_journal_PT10426.pdf"
-                    search_string = filename.replace(".pdf", "").lower()
-
-                journals[search_string] = os.path.join(journals_dir, filename)
-            except ValueError:
-                print(f"Could not parse filename: {filename}")
-                continue
-    return journals
-
-def fuzzy_search(query, choices, threshold=65):
-    """
-    Perform fuzzy search on a list of choices and return matches above threshold.
-    """
-    results = []
-    for choice in choices:
-        ratio = fuzz.partial_ratio(query.lower(), choice.lower())
-        if ratio >= threshold:
-            results.append((choice, ratio))
-    return sorted(results, key=lambda x: x[1], reverse=True)
+
+    # Regular text-only inference, also the fallback when images fail
+    yield from inference_stream(base_prompt)
+
+def stream_cached_document_response(text, question, images=None):
+    """stream_document_response, answering repeated questions from the answer cache."""
+    images = list(images or [])
+    # The answer also depends on the crew's notes and photos
+    scope = answer_scope(
+        text, st.session_state.additional_info,
+        *(hashlib.sha256(image.getvalue()).hexdigest() for image in images),
+    )
+    answer, embedding = answer_cache.lookup(scope, question)
+    if answer is not None:
+        yield answer
+        return
+
+    tokens = []
+    for token in stream_document_response(text, question, images=images):
+        tokens.append(token)
+        yield token
+    answer_cache.put(scope, question, "".join(tokens), embedding)
 
 # Function to display step indicators vertically
 def render_step_indicator(current_step):
@@ -244,7 +192,12 @@ if "summary" not in st.session_state:
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
 if "patient_journals" not in st.session_state:
-    st.session_state.patient_journals = load_patient_journals()
+    # Live search index shared by all sessions, updated as journals are added or removed
+    st.session_state.patient_journals = get_patient_registry().index
+    # Pre-extract journal text in the background (once per process)
+    journal_cache.warm_up()
+    # Brief patients as soon as their emergency call log arrives (once per process)
+    get_prefetcher()
 if "patient_images" not in st.session_state:
     st.session_state.patient_images = []
 if "additional_info" not in st.session_state:
@@ -252,7 +205,11 @@ if "additional_info" not in st.session_state:
 if "show_camera" not in st.session_state:
     st.session_state.show_camera = False
 if "rag" not in st.session_state:
-    st.session_state.rag = FHI_recommendations()
+    st.session_state.rag = get_shared_fhi_recommendations()
+    # Optional background warm-up of the LLM client and FHI engine (once per process)
+    if os.environ.get("WARM_UP_ON_START") == "1":
+        warm_up()
+        st.session_state.rag.start_background_init()
 if "patient_info" not in st.session_state:
     st.session_state.patient_info = ""
 
@@ -277,8 +234,7 @@ if st.session_state.step == 1:
         search_query = st.text_input("Search by name or number:").lower()
 
         if search_query:
-            journal_keys = list(st.session_state.patient_journals.keys())
-            matching_results = fuzzy_search(search_query, journal_keys)
+            matching_results = st.session_state.patient_journals.search(search_query)
 
             if matching_results:
                 top_matches = matching_results[:3]
@@ -291,13 +247,22 @@ if st.session_state.step == 1:
                 )
 
                 if st.button("Load Patient Data"):
-                    with open(matching_journals[selected_journal], "rb") as file:
-                        st.session_state.pdf_text = extract_text_from_pdf(file)
-                        patient_info = os.path.basename(file.name).replace(".pdf", "")
-                        st.session_state.patient_info = get_patient_log_summary(patient_info)
-                        with st.spinner("Analyzing patient emergency call log and journal..."):
-                            st.session_state.summary = get_journal_summary(st.session_state.pdf_text)
-                        st.rerun()
+                    # One indexed lookup for journal, call logs and stored summaries
+                    journal_path = matching_journals[selected_journal]
+                    record = get_patient_store().get_for_journal(selected_journal, journal_path)
+                    journal = journal_cache.get(journal_path)
+                    if record is not None and record.page_offsets is None:
+                        get_patient_store().set_page_offsets(record.key, journal.page_offsets)
+                    pdf_text = journal.text
+                    with st.spinner("Analyzing patient emergency call log and journal..."):
+                        # Both summaries are independent LLM calls, run them in parallel
+                        st.session_state.patient_info, st.session_state.summary = run_concurrently(
+                            lambda: get_patient_log_summary(record),
+                            lambda: get_journal_summary(pdf_text, journal_path, record),
+                        )
+                    st.session_state.pdf_text = pdf_text
+                    st.session_state.patient_record = record
+                    st.rerun()
             else:
                 st.warning("No matching patients found.")
 
@@ -344,12 +309,13 @@ elif st.session_state.step == 2:
     if st.session_state.show_camera:
         camera_image = st.camera_input("Take a picture")
         if camera_image:
-            with st.spinner("Processing and saving image..."):
-                os.makedirs("data/patient_images", exist_ok=True)
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            with st.spinner("Processing image..."):
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
                 image_path = f"data/patient_images/patient_photo_{timestamp}.jpg"
-                with open(image_path, "wb") as f:
-                    f.write(camera_image.getbuffer())
+                # Saved in the background; the session works on the in-memory image
+                image_store.persist(camera_image.getvalue(), image_path)
+                # Encode once now; analysis and chat turns reuse the cached payload
+                encode_image(camera_image)
                 st.session_state.patient_images.append(camera_image)
                 st.session_state.show_camera = False
                 st.rerun()
@@ -392,21 +358,20 @@ elif st.session_state.step == 3:
     # Only run analysis if it hasn't been done yet
     if 'current_analysis' not in st.session_state:
         with st.spinner("Analyzing all patient data..."):
-            # Get relevant FHI recommendations but limit the length
-            st.session_state.fhi_recommendations = st.session_state.rag.get_relevant_fhi_recommendations(
-                st.session_state.additional_info,
-                max_recommendations=2
-            )
+            # Worker threads cannot read st.session_state, so capture inputs first
+            rag = st.session_state.rag
+            additional_info = st.session_state.additional_info
+            patient_images = list(st.session_state.patient_images)
 
-            # Truncate the medical history and emergency log if too long
-            max_history_length = 500
-            truncated_medical_history = st.session_state.pdf_text[:max_history_length] + "..." if len(st.session_state.pdf_text) > max_history_length else st.session_state.pdf_text
+            # Condense the medical history to its diagnoses and most recent visits
+            condensed_medical_history = condense_journal(st.session_state.pdf_text)
 
             # Main analysis prompt - more concise version
             analysis_prompt = f"""
             Given these patient details:
             NOTES: {st.session_state.additional_info}
-            MEDICAL HISTORY: {truncated_medical_history}
+            MEDICAL HISTORY:
+            {condensed_medical_history}
             EMERGENCY LOG: {st.session_state.patient_info}
 
             Analyze these patient details for emergency response.
@@ -423,16 +388,23 @@ elif st.session_state.step == 3:
             - Point 2
             """
 
-            # Use vision inference with increased max_tokens
-            analysis = vision_inference(
-                st.session_state.patient_images,
-                analysis_prompt,
-                max_tokens=512
+            # Look up relevant FHI recommendations (limited length) in the
+            # background while the analysis streams in with increased max_tokens
+            record = st.session_state.get("patient_record")
+            if not additional_info.strip() and record is not None and record.call_log_paths:
+                # Without crew notes, use the recommendations prefetched for the emergency call
+                fhi_future = executor.submit(get_call_log_recommendations, record, rag)
+            else:
+                fhi_future = executor.submit(
+                    rag.get_relevant_fhi_recommendations, additional_info, max_recommendations=2
+                )
+            st.session_state.current_analysis = st.write_stream(
+                vision_inference_stream(patient_images, analysis_prompt, max_tokens=512)
             )
-            st.session_state.current_analysis = analysis
-
-    # Display the stored analysis
-    st.write(st.session_state.current_analysis)
+            st.session_state.fhi_recommendations = fhi_future.result()
+    else:
+        # Display the stored analysis
+        st.write(st.session_state.current_analysis)
 
     # Display recommendations summary
     with st.expander("Relevant Health Recommendations"):
@@ -449,14 +421,13 @@ elif st.session_state.step == 3:
     if st.button("Send message"):
         if user_question:
             st.session_state.chat_history.append(("user", user_question))
-            # Show spinner in the specific container
+            # Render the answer in the specific container as it streams in
             with spinner_container:
-                with st.spinner("Getting response..."):
-                    response = get_document_response(
-                        st.session_state.pdf_text,
-                        user_question,
-                        images=st.session_state.patient_images
-                    )
+                response = st.write_stream(stream_cached_document_response(
+                    st.session_state.pdf_text,
+                    user_question,
+                    images=st.session_state.patient_images
+                ))
             st.session_state.chat_history.append(("assistant", response))
             st.rerun()
 
@@ -1,31 +1,86 @@
 from os import environ
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from openai import OpenAI
+from llm_gateway import get_gateway
+from singleflight import SingleFlight, llm_singleflight
 
 load_dotenv()
 
-api_key = environ.get("NEBIUS_API_KEY")
 temperature = environ.get("TEMPERATURE", 0.0)
 
 # MODEL = "meta-llama/Llama-3.3-70B-Instruct"
 MODEL = "meta-llama/Llama-3.3-70B-Instruct-fast"
 
-assert api_key is not None, "NEBIUS_API_KEY is not set"
 assert temperature is not None, "TEMPERATURE is not set"
 
-client = OpenAI(
-    base_url="https://api.studio.nebius.ai/v1/",
-    api_key=api_key,
-)
-
 
 def inference(prompt: str) -> str:
-    completion = client.chat.completions.create(
+    def _complete():
+        completion = get_gateway().chat_completion(
+            model=MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=float(temperature),
+        )
+        return completion.choices[0].message.content
+
+    # Concurrent identical requests (e.g. several crews opening the same patient) share one call
+    key = SingleFlight.make_key(MODEL, float(temperature), prompt)
+    return llm_singleflight.do(key, _complete)
+
+
+def inference_stream(prompt: str):
+    """Like inference(), but yields the completion's text as it arrives."""
+    yield from get_gateway().chat_completion_stream(
         model=MODEL,
         messages=[{"role": "user", "content": prompt}],
         temperature=float(temperature),
     )
-    return completion.choices[0].message.content
 
 
-inference("hi, how are you?")
+# Shared pool for dispatching independent blocking calls (LLM requests, RAG
+# lookups) in parallel
+executor = ThreadPoolExecutor(
+    max_workers=int(environ.get("INFERENCE_WORKERS", 8)),
+    thread_name_prefix="inference",
+)
+
+
+def run_concurrently(*calls):
+    """
+    Run zero-argument callables in parallel on the shared pool.
+
+    Returns their results in argument order, so the total latency is that of
+    the slowest call. The first exception raised by a call is re-raised.
+    """
+    futures = [executor.submit(call) for call in calls]
+    return [future.result() for future in futures]
+
+
+_warm_up_started = False
+_warm_up_lock = threading.Lock()
+
+
+def warm_up(background: bool = True):
+    """
+    Optionally prime the client and the connection to the endpoint.
+
+    Runs a tiny completion once per process, on the shared pool by default.
+    Nothing calls this implicitly; see WARM_UP_ON_START in api.py and main.py.
+    """
+    global _warm_up_started
+    with _warm_up_lock:
+        if _warm_up_started:
+            return None
+        _warm_up_started = True
+
+    def _run():
+        try:
+            inference("hi, how are you?")
+        except Exception as e:
+            print(f"LLM warm-up failed: {e}")
+
+    if background:
+        return executor.submit(_run)
+    _run()
+    return None
@@ -1,56 +1,135 @@
 from os import environ
 from dotenv import load_dotenv
-from openai import OpenAI
+from llm_gateway import get_gateway
+from singleflight import SingleFlight, llm_singleflight
+from image_preprocessing import MAX_IMAGE_SIZE, map_images, preprocess_image
 import base64
-from PIL import Image
+import hashlib
 import io
+import os
+import threading
+from collections import OrderedDict
 
 load_dotenv()
 
-api_key = environ.get("NEBIUS_API_KEY")
 temperature = environ.get("TEMPERATURE", 0.1)
 
 MODEL = "llava-hf/llava-1.5-7b-hf"
 
-assert api_key is not None, "NEBIUS_API_KEY is not set"
 assert temperature is not None, "TEMPERATURE is not set"
 
-client = OpenAI(
-    base_url="https://api.studio.nebius.ai/v1/",
-    api_key=api_key,
-)
-
-
-def encode_image(image_input, target_size=(512, 512)):
+# Memory cap of the encoded image cache
+IMAGE_CACHE_MAX_BYTES = int(environ.get("IMAGE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+
+class EncodedImageCache:
+    """
+    LRU cache of base64 JPEG payloads, keyed by a hash of the original image
+    bytes and the target size, and bounded by the total size of the payloads.
+    """
+
+    def __init__(self, max_bytes: int = IMAGE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(image_data, target_size) -> str:
+        return f"{hashlib.sha256(image_data).hexdigest()}:{target_size[0]}x{target_size[1]}"
+
+    def get(self, key):
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def put(self, key, payload: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= len(self._entries.pop(key))
+            self._entries[key] = payload
+            self.total_bytes += len(payload)
+            # Evict least recently used payloads beyond the cap
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# Process-wide cache, so every analysis and chat turn reuses the same payloads
+image_cache = EncodedImageCache()
+
+
+def encode_image(image_input, target_size=MAX_IMAGE_SIZE):
+    """
+    Downscale an image (keeping its aspect ratio) and return it as a base64 JPEG.
+
+    Args:
+        image_input: Raw image bytes (bytes, bytearray, memoryview), a buffer object
+            (BytesIO, Streamlit UploadedFile), a file path or a base64 data URL
+        target_size: Bounding box the image is downscaled to fit
+    """
     # If the input is already a base64 string, return it directly
     if isinstance(image_input, str) and image_input.startswith("data:image"):
         return image_input.split(",")[1] if "," in image_input else image_input
 
-    # Handle Streamlit UploadedFile objects
-    if hasattr(image_input, "getvalue"):
+    # Raw image bytes are used as they are
+    if isinstance(image_input, (bytes, bytearray, memoryview)):
+        image_data = image_input
+    # BytesIO and Streamlit UploadedFile objects expose their buffer without a copy
+    elif hasattr(image_input, "getbuffer"):
+        image_data = image_input.getbuffer()
+    elif hasattr(image_input, "getvalue"):
         image_data = image_input.getvalue()
     # If it's a file path, read it
-    elif isinstance(image_input, (str, bytes)):
+    elif isinstance(image_input, (str, os.PathLike)):
         with open(image_input, "rb") as image_file:
             image_data = image_file.read()
     else:
         raise ValueError(f"Unsupported image input type: {type(image_input)}")
 
-    # Open and resize the image
+    cache_key = EncodedImageCache.make_key(image_data, target_size)
+    if isinstance(image_data, memoryview) and image_data is not image_input:
+        # Release our view so the caller's buffer can be resized again
+        image_data.release()
+    cached = image_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Decode from the caller's buffer directly; BytesIO shares bytes without copying
+    if hasattr(image_input, "getbuffer"):
+        image_input.seek(0)
+        image_file = image_input
+    else:
+        image_file = io.BytesIO(image_data)
+
     try:
-        img = Image.open(io.BytesIO(image_data))
-        img = img.convert('RGB')  # Convert to RGB mode
-        img = img.resize(target_size, Image.Resampling.LANCZOS)
-        
-        # Save the resized image to bytes
-        buffer = io.BytesIO()
-        img.save(buffer, format="JPEG")
-        return base64.b64encode(buffer.getvalue()).decode("utf-8")
+        result = preprocess_image(image_file, max_size=target_size)
     except Exception as e:
         raise ValueError(f"Failed to process image input: {e}")
+    print(f"Preprocessed image: {result.report()}")
+    payload = base64.b64encode(result.data).decode("utf-8")
 
+    image_cache.put(cache_key, payload)
+    return payload
 
-def vision_inference(image_paths, prompt, max_tokens=500):
+
+def _build_content(image_paths, prompt):
     # Ensure image_paths is a list
     if not isinstance(image_paths, list):
         image_paths = [image_paths]
@@ -58,32 +137,58 @@ def vision_inference(image_paths, prompt, max_tokens=500):
     # Create content list with prompt
     content = [{"type": "text", "text": prompt}]
 
-    # Process each image
-    for image_path in image_paths:
-        try:
-            base64_image = encode_image(image_path)
-            content.append(
-                {
-                    "type": "image_url",
-                    "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"},
-                }
-            )
-        except Exception as e:
-            print(f"Warning: Failed to process image {image_path}: {e}")
+    # Process the images in parallel, keeping their order
+    for idx, (image_path, base64_image) in enumerate(zip(image_paths, map_images(encode_image, image_paths))):
+        if isinstance(base64_image, Exception):
+            name = image_path if isinstance(image_path, str) else f"#{idx + 1}"
+            print(f"Warning: Failed to process image {name}: {base64_image}")
             continue
+        content.append(
+            {
+                "type": "image_url",
+                "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"},
+            }
+        )
 
     # Only proceed if we have at least one successfully processed image
     if len(content) < 2:  # Just the prompt, no images
         raise ValueError("No images were successfully processed")
 
-    try:
-        completion = client.chat.completions.create(
+    return content
+
+
+def vision_inference(image_paths, prompt, max_tokens=500):
+    content = _build_content(image_paths, prompt)
+
+    def _complete():
+        completion = get_gateway().chat_completion(
             model=MODEL,
             messages=[{"role": "user", "content": content}],
             temperature=float(temperature),
             max_tokens=max_tokens
         )
         return completion.choices[0].message.content
+
+    # The key covers the encoded images, so identical uploads share one call
+    key = SingleFlight.make_key(MODEL, float(temperature), max_tokens, content)
+    try:
+        return llm_singleflight.do(key, _complete)
+    except Exception as e:
+        print(f"Error during API call: {e}")
+        raise
+
+
+def vision_inference_stream(image_paths, prompt, max_tokens=500):
+    """Like vision_inference(), but yields the completion's text as it arrives."""
+    content = _build_content(image_paths, prompt)
+
+    try:
+        yield from get_gateway().chat_completion_stream(
+            model=MODEL,
+            messages=[{"role": "user", "content": content}],
+            temperature=float(temperature),
+            max_tokens=max_tokens,
+        )
     except Exception as e:
         print(f"Error during API call: {e}")
         raise
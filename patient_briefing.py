@@ -0,0 +1,114 @@
+"""
+Summaries that brief an ambulance crew on a patient.
+
+Shared by the Streamlit app, the API and the dispatch-time prefetcher, so a
+summary computed in one of them is a cache hit in the others.
+"""
+from patient_store import get_patient_store, source_signature
+from summary_cache import SUMMARY_CACHE_TTL_SECONDS, cached_inference, prompt_signature
+
+JOURNAL_SUMMARY_PROMPT = """This is a patient journal, showing the medical history of the patient. Return 3 main points that are most relevant to the patient's health, for emergency responders to know.
+{text}
+
+Please make the summary concise but include all important points.
+Only return the summary, no other text."""
+
+CALL_LOG_SUMMARY_PROMPT = """This is an emergency call log, showing the patient's emergency call history. Return 3 main points that are most relevant to the patient's health, for emergency responders to know.
+{text}
+
+Please make the summary concise but include all important points.
+Only return the summary, no other text."""
+
+PDF_SUMMARY_PROMPT = """Please provide a comprehensive summary of the following text:
+    
+{text}
+
+Please make the summary concise but include all important points."""
+
+NO_CALL_LOGS = "No previous emergency calls recorded for this patient."
+
+
+def _stored_summary(record, kind, template, paths, compute):
+    """
+    A summary kept on the patient record.
+
+    Like the summary cache it stands in for, it is recomputed when the
+    sources, the model, the prompt template or the temperature change, or
+    once it is older than the summary cache's TTL.
+    """
+    return get_patient_store().get_or_compute_summary(
+        record, kind, f"{prompt_signature(template)}|{source_signature(paths)}", compute,
+        max_age_seconds=SUMMARY_CACHE_TTL_SECONDS,
+    )
+
+
+def get_journal_summary(text, journal_path=None, record=None):
+    """Three main points of a journal for the crew (the Streamlit app's summary)."""
+    if record is None:
+        return cached_inference(JOURNAL_SUMMARY_PROMPT, text, source_path=journal_path)
+    # Stored on the patient record, so reloading a patient skips hashing the journal text
+    return _stored_summary(
+        record, "journal", JOURNAL_SUMMARY_PROMPT, [journal_path],
+        lambda: cached_inference(JOURNAL_SUMMARY_PROMPT, text, source_path=journal_path),
+    )
+
+
+def get_pdf_summary(text, journal_path=None, record=None):
+    """Comprehensive summary of a journal (the API's summary)."""
+    if record is None:
+        return cached_inference(PDF_SUMMARY_PROMPT, text, source_path=journal_path)
+    return _stored_summary(
+        record, "pdf", PDF_SUMMARY_PROMPT, [journal_path],
+        lambda: cached_inference(PDF_SUMMARY_PROMPT, text, source_path=journal_path),
+    )
+
+
+def get_patient_log_summary(record):
+    """Given the patient's record from the patient store, retrieve summary of emergency call logs."""
+    if record is None or not record.call_log_paths:
+        return NO_CALL_LOGS
+
+    def summarize():
+        log_text = "\n\n".join(open(path, "r").read() for path in record.call_log_paths)
+        return cached_inference(CALL_LOG_SUMMARY_PROMPT, log_text, source_path=record.call_log_paths[0])
+
+    try:
+        return _stored_summary(record, "call_log", CALL_LOG_SUMMARY_PROMPT, record.call_log_paths, summarize)
+    except FileNotFoundError:
+        return NO_CALL_LOGS
+    except OSError as e:
+        print(f"Error reading emergency log: {e}")
+        return "Unable to retrieve emergency call history."
+
+
+def get_call_log_recommendations(record, rag, call_log_summary=None, max_recommendations=2):
+    """
+    FHI recommendations relevant to the patient's emergency calls.
+
+    Results are stored on the patient record only once the engine runs
+    hybrid retrieval, and only for the corpus version they came from; the
+    BM25-only answers of a cold engine are returned but not kept.
+
+    Args:
+        record: The patient's record from the patient store
+        rag: FHI_recommendations engine
+        call_log_summary: Summary of the call logs, computed if not given
+        max_recommendations: Number of recommendations to include
+
+    Returns:
+        None if the patient has no call logs
+    """
+    if record is None or not record.call_log_paths:
+        return None
+    if call_log_summary is None:
+        call_log_summary = get_patient_log_summary(record)
+
+    def recommend():
+        return rag.get_relevant_fhi_recommendations(call_log_summary, max_recommendations=max_recommendations)
+
+    if not rag.is_ready:
+        return recommend()
+    signature = f"fhi:{rag.corpus_version}:{max_recommendations}|{source_signature(record.call_log_paths)}"
+    return get_patient_store().get_or_compute_summary(
+        record, "call_log_fhi", signature, recommend, max_age_seconds=SUMMARY_CACHE_TTL_SECONDS,
+    )
@@ -0,0 +1,234 @@
+import os
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from patient_search import PatientSearchIndex
+
+JOURNALS_DIRECTORY = "data/journals"
+CALL_LOGS_DIRECTORY = "data/emergency_call_logs"
+
+# "Ola Hansen - 120384 12345", also with an en dash or no separator at all
+PATIENT_FILENAME_PATTERN = re.compile(
+    r"^(?P<name>.+?)\s+(?:[-–]\s+)?(?P<dob>\d{6})\s+(?P<personal_number>\d{5})$"
+)
+
+
+def parse_patient_filename(filename: str) -> Optional[Tuple[str, str, str]]:
+    """
+    Parse "name - dob personal_number.ext" into (name, dob, personal_number).
+
+    Returns:
+        None if the filename does not follow the pattern
+    """
+    match = PATIENT_FILENAME_PATTERN.match(os.path.splitext(filename)[0].strip())
+    if match is None:
+        return None
+    return match.group("name").strip(), match.group("dob"), match.group("personal_number")
+
+
+def patient_key(filename: str) -> str:
+    """Search key of a patient file: "name dob personal_number", lowercased."""
+    parsed = parse_patient_filename(filename)
+    if parsed is None:
+        # Other formats, e.g. "patient_journal_PT10426.pdf", are searched by filename
+        return os.path.splitext(filename)[0].lower()
+    name, dob, personal_number = parsed
+    return f"{name.lower()} {dob} {personal_number}"
+
+
+def load_patient_journals(journals_dir: str = JOURNALS_DIRECTORY) -> Dict[str, str]:
+    """Map the search key of every journal PDF in a directory to its path."""
+    journals = {}
+    for filename in sorted(os.listdir(journals_dir)):
+        if filename.endswith(".pdf"):
+            journals[patient_key(filename)] = os.path.join(journals_dir, filename)
+    return journals
+
+
+class PatientRegistry:
+    """
+    Live registry of patient journals and emergency call logs.
+
+    The directories are scanned once; after that a watchdog observer applies
+    created, deleted and moved files to the search index, the call log table
+    and the patient store incrementally, so new journals show up without a
+    restart.
+    """
+
+    def __init__(self, journals_dir: str = JOURNALS_DIRECTORY, call_logs_dir: str = CALL_LOGS_DIRECTORY,
+                 store=None):
+        self.journals_dir = os.path.abspath(journals_dir)
+        self.call_logs_dir = os.path.abspath(call_logs_dir)
+        # Optional PatientStore kept in sync with the directories
+        self.store = store
+        self.index = PatientSearchIndex()
+        # patient key -> call log paths
+        self.call_logs: Dict[str, List[str]] = {}
+        self._lock = threading.RLock()
+        self._observer = None
+        # Called with (kind, path) for files added or changed after the initial scan
+        self._listeners: List[Callable[[str, str], None]] = []
+        self.scan()
+
+    def scan(self) -> None:
+        """Index every file currently in the watched directories."""
+        for directory in (self.journals_dir, self.call_logs_dir):
+            if not os.path.isdir(directory):
+                continue
+            for filename in sorted(os.listdir(directory)):
+                self._index_file(os.path.join(directory, filename))
+        if self.store is not None:
+            self.store.bulk_import(self.journals_dir, self.call_logs_dir)
+
+    def _kind(self, path: str) -> Optional[str]:
+        directory = os.path.dirname(os.path.abspath(path))
+        if directory == self.journals_dir and path.endswith(".pdf"):
+            return "journal"
+        if directory == self.call_logs_dir and path.endswith(".txt"):
+            return "call_log"
+        return None
+
+    def add_listener(self, callback: Callable[[str, str], None]) -> None:
+        """Call callback(kind, path) whenever a journal or call log is added or changed."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def file_added(self, path: str) -> None:
+        kind = self._index_file(path)
+        if kind is None:
+            return
+        if self.store is not None:
+            if kind == "journal":
+                self.store.add_journal(path)
+            else:
+                self.store.add_call_log(path)
+        with self._lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback(kind, path)
+            except Exception as e:
+                print(f"Patient registry listener failed for {path}: {e}")
+
+    def _index_file(self, path: str) -> Optional[str]:
+        kind = self._kind(path)
+        if kind is None:
+            return None
+        key = patient_key(os.path.basename(path))
+        with self._lock:
+            if kind == "journal":
+                self.index.add(key, path)
+            else:
+                paths = self.call_logs.setdefault(key, [])
+                if path not in paths:
+                    paths.append(path)
+        return kind
+
+    def file_removed(self, path: str) -> None:
+        kind = self._kind(path)
+        if kind is None:
+            return
+        key = patient_key(os.path.basename(path))
+        with self._lock:
+            if kind == "journal":
+                # Only drop the key if it still points at this file
+                if os.path.abspath(self.index.get(key, "")) == os.path.abspath(path):
+                    self.index.remove(key)
+            else:
+                paths = self.call_logs.get(key, [])
+                if path in paths:
+                    paths.remove(path)
+                if not paths:
+                    self.call_logs.pop(key, None)
+        if self.store is not None:
+            if kind == "journal":
+                self.store.remove_journal(path)
+            else:
+                self.store.remove_call_log(path)
+
+    def file_moved(self, src_path: str, dest_path: str) -> None:
+        self.file_removed(src_path)
+        self.file_added(dest_path)
+
+    def call_log_paths(self, key: str) -> List[str]:
+        """Emergency call logs recorded for a patient key."""
+        with self._lock:
+            return list(self.call_logs.get(key, []))
+
+    def start(self) -> bool:
+        """
+        Start watching the directories in a background thread.
+
+        Returns:
+            False if watchdog is not available; the registry then stays a
+            static snapshot
+        """
+        with self._lock:
+            if self._observer is not None:
+                return True
+            try:
+                from watchdog.events import FileSystemEventHandler
+                from watchdog.observers import Observer
+            except ImportError:
+                print("watchdog is not installed; patient registry will not pick up new files")
+                return False
+
+            registry = self
+
+            class Handler(FileSystemEventHandler):
+                def on_created(self, event):
+                    if not event.is_directory:
+                        registry.file_added(event.src_path)
+
+                def on_modified(self, event):
+                    # Refreshes the stored journal version once a new file is fully written
+                    if not event.is_directory:
+                        registry.file_added(event.src_path)
+
+                def on_deleted(self, event):
+                    if not event.is_directory:
+                        registry.file_removed(event.src_path)
+
+                def on_moved(self, event):
+                    if not event.is_directory:
+                        registry.file_moved(event.src_path, event.dest_path)
+
+            observer = Observer()
+            for directory in (self.journals_dir, self.call_logs_dir):
+                if os.path.isdir(directory):
+                    observer.schedule(Handler(), directory, recursive=False)
+            observer.daemon = True
+            observer.start()
+            self._observer = observer
+            return True
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._observer is not None:
+                self._observer.stop()
+                self._observer.join()
+                self._observer = None
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_patient_registry() -> PatientRegistry:
+    """
+    Return the process-wide registry, scanning and starting the watcher on first use.
+
+    The registry keeps the process-wide patient store in sync.
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                # Imported here because patient_store uses this module's filename parsing
+                from patient_store import get_patient_store
+
+                registry = PatientRegistry(store=get_patient_store())
+                registry.start()
+                _registry = registry
+    return _registry
@@ -0,0 +1,150 @@
+import heapq
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+from fuzzywuzzy import fuzz
+
+NGRAM_SIZE = 3
+# Only this many n-gram candidates are re-ranked with the fuzzy scorer
+MAX_CANDIDATES = 50
+DEFAULT_THRESHOLD = 65
+
+# Norwegian date of birth (DDMMYY), personal number and their 11-digit combination
+DOB_PATTERN = re.compile(r"^\d{6}$")
+PERSONAL_NUMBER_PATTERN = re.compile(r"^\d{5}$")
+NATIONAL_ID_PATTERN = re.compile(r"^\d{11}$")
+
+
+def ngrams(text: str, n: int = NGRAM_SIZE, pad_end: bool = True) -> Set[str]:
+    """
+    Character n-grams of text, lowercased, with its words padded by spaces.
+
+    Queries pass pad_end=False, since their last word may still be incomplete.
+    """
+    text = f" {' '.join(text.lower().split())}{' ' if pad_end else ''}"
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class PatientSearchIndex:
+    """
+    Search index over patient journal keys ("name dob personal_number").
+
+    Keys are indexed once by character trigram, date of birth and personal
+    number. A query first collects candidates by exact number lookup and by
+    shared trigrams, then only the best candidates are scored with
+    fuzz.partial_ratio, so the cost no longer grows with every key scanned.
+    Keys can be added and removed incrementally.
+    """
+
+    def __init__(self, journals: Optional[Dict[str, str]] = None, max_candidates: int = MAX_CANDIDATES):
+        self.max_candidates = max_candidates
+        self.journals: Dict[str, str] = {}
+        self.postings: Dict[str, Set[str]] = {}
+        self.by_dob: Dict[str, Set[str]] = {}
+        self.by_personal_number: Dict[str, Set[str]] = {}
+        self._lock = threading.RLock()
+        for key, path in (journals or {}).items():
+            self.add(key, path)
+
+    def __len__(self):
+        return len(self.journals)
+
+    def __contains__(self, key):
+        return key in self.journals
+
+    def __getitem__(self, key):
+        return self.journals[key]
+
+    def get(self, key, default=None):
+        return self.journals.get(key, default)
+
+    def keys(self):
+        return self.journals.keys()
+
+    @staticmethod
+    def _numbers(key: str) -> Tuple[List[str], List[str]]:
+        tokens = key.split()
+        dobs = [t for t in tokens if DOB_PATTERN.match(t)]
+        personal_numbers = [t for t in tokens if PERSONAL_NUMBER_PATTERN.match(t)]
+        return dobs, personal_numbers
+
+    def add(self, key: str, path: str) -> None:
+        """Index a journal key, replacing any previous entry for it."""
+        key = key.lower()
+        with self._lock:
+            if key in self.journals:
+                self.remove(key)
+            self.journals[key] = path
+            for gram in ngrams(key):
+                self.postings.setdefault(gram, set()).add(key)
+            dobs, personal_numbers = self._numbers(key)
+            for dob in dobs:
+                self.by_dob.setdefault(dob, set()).add(key)
+            for number in personal_numbers:
+                self.by_personal_number.setdefault(number, set()).add(key)
+
+    def remove(self, key: str) -> None:
+        """Remove a journal key; unknown keys are ignored."""
+        key = key.lower()
+        with self._lock:
+            if self.journals.pop(key, None) is None:
+                return
+            dobs, personal_numbers = self._numbers(key)
+            for table, values in ((self.postings, ngrams(key)), (self.by_dob, dobs),
+                                  (self.by_personal_number, personal_numbers)):
+                for value in values:
+                    keys = table.get(value)
+                    if keys is not None:
+                        keys.discard(key)
+                        if not keys:
+                            del table[value]
+
+    def exact_matches(self, query: str) -> Set[str]:
+        """Keys whose date of birth, personal number or national id equals a query token."""
+        matches = set()
+        for token in query.split():
+            if DOB_PATTERN.match(token):
+                matches |= self.by_dob.get(token, set())
+            elif PERSONAL_NUMBER_PATTERN.match(token):
+                matches |= self.by_personal_number.get(token, set())
+            elif NATIONAL_ID_PATTERN.match(token):
+                matches |= self.by_dob.get(token[:6], set()) & self.by_personal_number.get(token[6:], set())
+        return matches
+
+    def candidates(self, query: str) -> List[str]:
+        """Keys sharing the most n-grams with the query, best first."""
+        # Queries shorter than an n-gram fall back to a substring scan
+        if len(query) < NGRAM_SIZE:
+            return [key for key in self.journals if query in key][:self.max_candidates]
+        counts = Counter()
+        for gram in ngrams(query, pad_end=False):
+            counts.update(self.postings.get(gram, ()))
+        return [key for key, _ in heapq.nlargest(self.max_candidates, counts.items(), key=lambda x: x[1])]
+
+    def search(self, query: str, threshold: int = DEFAULT_THRESHOLD, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """
+        Find journal keys matching the query.
+
+        Returns:
+            (key, score) pairs with score >= threshold, best first; exact
+            date of birth or personal number matches score 100
+        """
+        query = query.lower().strip()
+        if not query:
+            return []
+
+        with self._lock:
+            exact = self.exact_matches(query)
+            candidates = self.candidates(query)
+
+        results = {key: 100 for key in exact}
+        for key in candidates:
+            if key in results:
+                continue
+            ratio = fuzz.partial_ratio(query, key)
+            if ratio >= threshold:
+                results[key] = ratio
+        ranked = sorted(results.items(), key=lambda x: x[1], reverse=True)
+        return ranked[:limit] if limit is not None else ranked
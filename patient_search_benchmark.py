@@ -0,0 +1,103 @@
+"""
+Query latency of the patient search index against a linear fuzzy scan.
+
+Builds registries of synthetic patients ("name dob personal_number") and
+times typical queries: partial names, misspellings, dates of birth and
+personal numbers.
+
+Usage:
+    python patient_search_benchmark.py [size ...]    (default: 10000 100000)
+"""
+import random
+import sys
+import time
+
+from fuzzywuzzy import fuzz
+
+from patient_search import PatientSearchIndex
+
+FIRST_NAMES = [
+    "ola", "kari", "anne", "andreas", "bjørn", "erik", "ingrid", "marte", "per", "nils",
+    "sofie", "emma", "nora", "jonas", "lars", "hanne", "silje", "thomas", "kristin", "magnus",
+    "ida", "henrik", "maria", "sindre", "tone", "eirik", "astrid", "jon", "liv", "knut",
+]
+LAST_NAMES = [
+    "hansen", "johansen", "olsen", "larsen", "andersen", "pedersen", "nilsen", "kristiansen",
+    "jensen", "karlsen", "johnsen", "pettersen", "eriksen", "berg", "haugen", "hagen",
+    "johannessen", "andreassen", "jacobsen", "dahl", "jørgensen", "halvorsen", "henriksen",
+    "lund", "sørensen", "jakobsen", "moen", "gundersen", "iversen", "strand", "solberg",
+]
+
+QUERY_COUNT = 50
+
+
+def synthetic_journals(size: int, seed: int = 0):
+    rng = random.Random(seed)
+    journals = {}
+    while len(journals) < size:
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        dob = f"{rng.randint(1, 28):02d}{rng.randint(1, 12):02d}{rng.randint(0, 99):02d}"
+        key = f"{name} {dob} {rng.randint(10000, 99999)}"
+        journals[key] = f"data/journals/{key}.pdf"
+    return journals
+
+
+def synthetic_queries(journals, seed: int = 1):
+    rng = random.Random(seed)
+    keys = rng.sample(list(journals), QUERY_COUNT)
+    queries = []
+    for i, key in enumerate(keys):
+        first, last, dob, number = key.split(" ")
+        kind = i % 5
+        if kind == 0:
+            queries.append(f"{first} {last[:4]}")
+        elif kind == 1:
+            # Transposed letters in the last name
+            queries.append(f"{first} {last[1]}{last[0]}{last[2:]}")
+        elif kind == 2:
+            queries.append(dob)
+        elif kind == 3:
+            queries.append(number)
+        else:
+            queries.append(f"{last} {dob}")
+    return queries
+
+
+def linear_search(query, choices, threshold=65):
+    """The previous fuzzy_search: partial_ratio against every key."""
+    results = []
+    for choice in choices:
+        ratio = fuzz.partial_ratio(query.lower(), choice.lower())
+        if ratio >= threshold:
+            results.append((choice, ratio))
+    return sorted(results, key=lambda x: x[1], reverse=True)
+
+
+def _time_queries(search, queries):
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        search(query)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)]
+
+
+def main(sizes):
+    print(f"{'patients':>9} {'build s':>8} {'index p50 ms':>13} {'index p95 ms':>13} {'linear p50 ms':>14}")
+    for size in sizes:
+        journals = synthetic_journals(size)
+        queries = synthetic_queries(journals)
+
+        started = time.perf_counter()
+        index = PatientSearchIndex(journals)
+        build_seconds = time.perf_counter() - started
+
+        p50, p95 = _time_queries(index.search, queries)
+        # The linear scan is slow at large sizes, so time a handful of queries
+        linear_p50, _ = _time_queries(lambda q: linear_search(q, journals), queries[:5])
+        print(f"{size:>9} {build_seconds:>8.2f} {p50 * 1000:>13.2f} {p95 * 1000:>13.2f} {linear_p50 * 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or [10000, 100000])
@@ -0,0 +1,347 @@
+"""
+Patient record store backed by SQLite.
+
+One row per patient, keyed by the patient key ("name dob personal_number",
+the same key the search index uses), holding the journal location, the
+emergency call logs, the page offsets of the extracted journal text and the
+cached summaries. Loading a patient is one indexed lookup instead of
+directory scans and path reconstruction.
+
+The national id (date of birth + personal number) is not unique on its own:
+the sample data has "Anne Johansen 041263 54321" and "Per Johansen 041263
+54321", so it is stored as an attribute but never used to join records.
+
+Usage (bulk import of the data/ layout):
+    python patient_store.py [journals_dir] [call_logs_dir]
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from patient_registry import CALL_LOGS_DIRECTORY, JOURNALS_DIRECTORY, parse_patient_filename, patient_key
+
+PATIENT_STORE_PATH = ".cache/patients.sqlite3"
+# Bumped when the tables change; older stores are rebuilt from the files
+SCHEMA_VERSION = 2
+
+
+def national_id(dob: str, personal_number: str) -> str:
+    return f"{dob}{personal_number}"
+
+
+class PatientRecord:
+    """Everything known about a patient, as stored in one row plus its call logs."""
+
+    def __init__(self, key: str, national_id: str, name: str, dob: str, personal_number: str,
+                 journal_path: Optional[str], journal_mtime_ns: Optional[int],
+                 page_offsets: Optional[List[int]], summaries: Dict[str, dict],
+                 call_log_paths: List[str]):
+        self.key = key
+        self.national_id = national_id
+        self.name = name
+        self.dob = dob
+        self.personal_number = personal_number
+        self.journal_path = journal_path
+        self.journal_mtime_ns = journal_mtime_ns
+        self.page_offsets = page_offsets
+        # kind -> {"signature": ..., "value": ...}
+        self.summaries = summaries
+        self.call_log_paths = call_log_paths
+
+
+class PatientStore:
+    """SQLite store of patient records; safe to share between threads."""
+
+    def __init__(self, path: str = PATIENT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                # Only derived data: the next bulk import fills the new tables
+                self._conn.execute("DROP TABLE IF EXISTS patients")
+                self._conn.execute("DROP TABLE IF EXISTS call_logs")
+                self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS patients (
+                    patient_key TEXT PRIMARY KEY,
+                    national_id TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    dob TEXT NOT NULL,
+                    personal_number TEXT NOT NULL,
+                    journal_path TEXT,
+                    journal_mtime_ns INTEGER,
+                    page_offsets TEXT,
+                    summaries TEXT NOT NULL DEFAULT '{}',
+                    updated_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS call_logs (
+                    patient_key TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    PRIMARY KEY (patient_key, path)
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS patients_journal ON patients (journal_path)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS patients_national_id ON patients (national_id)")
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def _ensure_patient(conn: sqlite3.Connection, filename: str) -> Optional[str]:
+        parsed = parse_patient_filename(filename)
+        if parsed is None:
+            return None
+        name, dob, personal_number = parsed
+        key = patient_key(filename)
+        conn.execute("""
+            INSERT OR IGNORE INTO patients (patient_key, national_id, name, dob, personal_number, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (key, national_id(dob, personal_number), name, dob, personal_number, time.time()))
+        return key
+
+    def _add_journal(self, conn: sqlite3.Connection, path: str) -> Optional[str]:
+        key = self._ensure_patient(conn, os.path.basename(path))
+        if key is None:
+            return None
+        path = os.path.abspath(path)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        # Offsets and summaries belong to the previous version of a changed journal
+        conn.execute("""
+            UPDATE patients SET
+                page_offsets = CASE WHEN journal_path IS ? AND journal_mtime_ns IS ? THEN page_offsets END,
+                summaries = CASE WHEN journal_path IS ? AND journal_mtime_ns IS ? THEN summaries ELSE '{}' END,
+                journal_path = ?, journal_mtime_ns = ?, updated_at = ?
+            WHERE patient_key = ?
+        """, (path, mtime_ns, path, mtime_ns, path, mtime_ns, time.time(), key))
+        return key
+
+    def _add_call_log(self, conn: sqlite3.Connection, path: str) -> Optional[str]:
+        key = self._ensure_patient(conn, os.path.basename(path))
+        if key is not None:
+            conn.execute("INSERT OR IGNORE INTO call_logs VALUES (?, ?)", (key, os.path.abspath(path)))
+        return key
+
+    @staticmethod
+    def _drop_if_empty(conn: sqlite3.Connection, key: str) -> None:
+        conn.execute("""
+            DELETE FROM patients WHERE patient_key = ? AND journal_path IS NULL
+                AND NOT EXISTS (SELECT 1 FROM call_logs WHERE patient_key = ?)
+        """, (key, key))
+
+    def add_journal(self, path: str) -> Optional[str]:
+        """Record a journal PDF; returns the patient key, or None if the name does not parse."""
+        with self._lock:
+            conn = self._connection()
+            key = self._add_journal(conn, path)
+            conn.commit()
+            return key
+
+    def remove_journal(self, path: str) -> None:
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT patient_key FROM patients WHERE journal_path = ?", (os.path.abspath(path),)
+            ).fetchone()
+            if row is not None:
+                conn.execute("""
+                    UPDATE patients SET journal_path = NULL, journal_mtime_ns = NULL, page_offsets = NULL,
+                        summaries = '{}', updated_at = ?
+                    WHERE patient_key = ?
+                """, (time.time(), row[0]))
+                self._drop_if_empty(conn, row[0])
+            conn.commit()
+
+    def add_call_log(self, path: str) -> Optional[str]:
+        """Record an emergency call log; returns the patient key, or None if the name does not parse."""
+        with self._lock:
+            conn = self._connection()
+            key = self._add_call_log(conn, path)
+            conn.commit()
+            return key
+
+    def remove_call_log(self, path: str) -> None:
+        with self._lock:
+            conn = self._connection()
+            path = os.path.abspath(path)
+            row = conn.execute("SELECT patient_key FROM call_logs WHERE path = ?", (path,)).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM call_logs WHERE path = ?", (path,))
+                self._drop_if_empty(conn, row[0])
+            conn.commit()
+
+    def bulk_import(self, journals_dir: str = JOURNALS_DIRECTORY,
+                    call_logs_dir: str = CALL_LOGS_DIRECTORY) -> Dict[str, int]:
+        """
+        Import every journal and call log of the data/ layout in one transaction.
+
+        Files that disappeared since the last import are dropped.
+
+        Returns:
+            Counts of imported journals and call logs
+        """
+        stats = {"journals": 0, "call_logs": 0}
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                journal_paths = set()
+                if os.path.isdir(journals_dir):
+                    for filename in sorted(os.listdir(journals_dir)):
+                        if filename.endswith(".pdf"):
+                            path = os.path.join(journals_dir, filename)
+                            if self._add_journal(conn, path) is not None:
+                                journal_paths.add(os.path.abspath(path))
+                                stats["journals"] += 1
+
+                call_log_paths = set()
+                if os.path.isdir(call_logs_dir):
+                    for filename in sorted(os.listdir(call_logs_dir)):
+                        if filename.endswith(".txt"):
+                            path = os.path.join(call_logs_dir, filename)
+                            if self._add_call_log(conn, path) is not None:
+                                call_log_paths.add(os.path.abspath(path))
+                                stats["call_logs"] += 1
+
+                stale = [row for row in conn.execute("SELECT patient_key, journal_path FROM patients")
+                         if row[1] is not None and row[1] not in journal_paths]
+                for key, _ in stale:
+                    conn.execute("""
+                        UPDATE patients SET journal_path = NULL, journal_mtime_ns = NULL,
+                            page_offsets = NULL, summaries = '{}'
+                        WHERE patient_key = ?
+                    """, (key,))
+                for key, path in conn.execute("SELECT patient_key, path FROM call_logs").fetchall():
+                    if path not in call_log_paths:
+                        conn.execute("DELETE FROM call_logs WHERE path = ?", (path,))
+                conn.execute("""
+                    DELETE FROM patients WHERE journal_path IS NULL
+                        AND patient_key NOT IN (SELECT patient_key FROM call_logs)
+                """)
+        return stats
+
+    def get_by_key(self, key: str) -> Optional[PatientRecord]:
+        """Look up a patient by search key ("name dob personal_number")."""
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("""
+                SELECT patient_key, national_id, name, dob, personal_number, journal_path, journal_mtime_ns,
+                       page_offsets, summaries
+                FROM patients WHERE patient_key = ?
+            """, (key,)).fetchone()
+            if row is None:
+                return None
+            call_log_paths = [path for (path,) in conn.execute(
+                "SELECT path FROM call_logs WHERE patient_key = ? ORDER BY path", (key,)
+            )]
+        return PatientRecord(
+            *row[:7],
+            page_offsets=json.loads(row[7]) if row[7] else None,
+            summaries=json.loads(row[8]),
+            call_log_paths=call_log_paths,
+        )
+
+    def get_for_journal(self, key: str, journal_path: str) -> Optional[PatientRecord]:
+        """
+        The record of a patient key, provided it describes the given journal.
+
+        Callers pass the path the search index holds for the key; a record
+        pointing at any other file is not this patient's and is never used.
+        """
+        record = self.get_by_key(key)
+        if record is None or record.journal_path is None:
+            return record
+        if os.path.abspath(record.journal_path) != os.path.abspath(journal_path):
+            print(f"Patient record for {key} points at {record.journal_path}, not {journal_path}; ignoring it")
+            return None
+        return record
+
+    def set_page_offsets(self, key: str, page_offsets: List[int]) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "UPDATE patients SET page_offsets = ? WHERE patient_key = ?",
+                (json.dumps(page_offsets), key),
+            )
+            conn.commit()
+
+    def set_summary(self, key: str, kind: str, signature: str, value: str) -> None:
+        """Store a summary of kind ("journal", "pdf", "call_log", ...) computed from sources identified by signature."""
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT summaries FROM patients WHERE patient_key = ?", (key,)).fetchone()
+            if row is None:
+                return
+            summaries = json.loads(row[0])
+            summaries[kind] = {"signature": signature, "value": value, "created_at": time.time()}
+            conn.execute(
+                "UPDATE patients SET summaries = ? WHERE patient_key = ?",
+                (json.dumps(summaries), key),
+            )
+            conn.commit()
+
+    def get_or_compute_summary(self, record: PatientRecord, kind: str, signature: str,
+                               compute: Callable[[], str], max_age_seconds: Optional[float] = None) -> str:
+        """
+        Return the record's summary of kind if its signature still matches, else compute and store it.
+
+        Args:
+            signature: Identifies everything the summary depends on (sources, model, prompt)
+            max_age_seconds: Recompute summaries stored longer ago than this
+        """
+        cached = record.summaries.get(kind)
+        if (cached is not None and cached["signature"] == signature
+                and (max_age_seconds is None or time.time() - cached.get("created_at", 0) <= max_age_seconds)):
+            return cached["value"]
+        value = compute()
+        self.set_summary(record.key, kind, signature, value)
+        record.summaries[kind] = {"signature": signature, "value": value, "created_at": time.time()}
+        return value
+
+
+def source_signature(paths: List[str]) -> str:
+    """Identifies the current version of a set of source files by path, mtime and size."""
+    parts = []
+    for path in sorted(paths):
+        try:
+            stat = os.stat(path)
+            parts.append(f"{path}:{stat.st_mtime_ns}:{stat.st_size}")
+        except FileNotFoundError:
+            parts.append(f"{path}:missing")
+    return "|".join(parts)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_patient_store() -> PatientStore:
+    """Return the process-wide patient store."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = PatientStore()
+    return _store
+
+
+if __name__ == "__main__":
+    journals_dir = sys.argv[1] if len(sys.argv) > 1 else JOURNALS_DIRECTORY
+    call_logs_dir = sys.argv[2] if len(sys.argv) > 2 else CALL_LOGS_DIRECTORY
+    started = time.perf_counter()
+    stats = get_patient_store().bulk_import(journals_dir, call_logs_dir)
+    print(f"Imported {stats['journals']} journals and {stats['call_logs']} call logs "
+          f"in {time.perf_counter() - started:.2f}s into {PATIENT_STORE_PATH}")
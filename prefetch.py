@@ -0,0 +1,148 @@
+"""
+Dispatch-time prefetch of patient briefings.
+
+An emergency call log is written minutes before the crew reaches the
+patient. When one lands in the call log directory, the patient is resolved
+from the filename the same way journals are matched, and everything "Load
+Patient Data" needs is computed in the background: the journal text and
+page offsets, the journal summaries used by the app and the API, the call
+log summary and FHI recommendations for the call. The crew's lookup then
+only reads caches.
+"""
+import os
+import threading
+import time
+from os import environ
+from typing import Dict
+
+from dotenv import load_dotenv
+
+from jobs import QueueFull, job_queue
+from journal_cache import journal_cache
+from nebius_inference import run_concurrently
+from patient_briefing import get_call_log_recommendations, get_journal_summary, get_patient_log_summary, get_pdf_summary
+from patient_registry import get_patient_registry, patient_key
+from patient_store import get_patient_store
+from rag_fhi import get_shared_fhi_recommendations
+
+load_dotenv()
+
+PREFETCH_ON_CALL_LOG = environ.get("PREFETCH_ON_CALL_LOG", "1") == "1"
+# Call logs are often written in several chunks; wait for the file to settle
+PREFETCH_DELAY_SECONDS = 2.0
+
+
+class PatientPrefetcher:
+    """Schedules a low-priority prefetch job for the patient of every new or changed call log."""
+
+    def __init__(self, registry, delay_seconds: float = PREFETCH_DELAY_SECONDS):
+        self.registry = registry
+        self.delay_seconds = delay_seconds
+        # patient key -> timer of the pending prefetch
+        self._timers: Dict[str, threading.Timer] = {}
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+
+    def file_added(self, kind: str, path: str) -> None:
+        """Registry listener; journals are left to the journal cache warm-up."""
+        if kind == "call_log":
+            self.schedule(patient_key(os.path.basename(path)))
+
+    def schedule(self, key: str) -> None:
+        """Prefetch a patient after delay_seconds, restarting the delay if already scheduled."""
+        with self._lock:
+            timer = self._timers.pop(key, None)
+            if timer is not None:
+                timer.cancel()
+            timer = threading.Timer(self.delay_seconds, self._submit, args=(key,))
+            timer.daemon = True
+            self._timers[key] = timer
+            timer.start()
+
+    def _submit(self, key: str) -> None:
+        with self._lock:
+            self._timers.pop(key, None)
+        try:
+            job_queue.submit("prefetch", lambda: self.prefetch(key), "low")
+        except QueueFull:
+            print(f"Job queue is full, not prefetching {key}")
+
+    def prefetch(self, key: str) -> Dict:
+        """
+        Compute and cache the briefing of a patient.
+
+        Each part is attempted even if another fails, so a missing journal
+        or an unavailable FHI engine does not prevent the other summaries.
+
+        Returns:
+            The parts that were prefetched, failures and the time taken
+        """
+        started = time.perf_counter()
+        store = get_patient_store()
+        journal_path = self.registry.index.get(key)
+        record = store.get_for_journal(key, journal_path) if journal_path else store.get_by_key(key)
+        prefetched, errors = [], {}
+
+        def attempt(name, function):
+            try:
+                result = function()
+                prefetched.append(name)
+                return result
+            except Exception as e:
+                errors[name] = str(e)
+                return None
+
+        if journal_path:
+            journal = attempt("journal_text", lambda: journal_cache.get(journal_path))
+            if journal is not None:
+                if record is not None and record.page_offsets is None:
+                    store.set_page_offsets(record.key, journal.page_offsets)
+                # Independent LLM calls, the same pair "Load Patient Data" and /api/load_journal make
+                run_concurrently(
+                    lambda: attempt("journal_summary", lambda: get_journal_summary(journal.text, journal_path, record)),
+                    lambda: attempt("pdf_summary", lambda: get_pdf_summary(journal.text, journal_path, record)),
+                )
+
+        if record is not None and record.call_log_paths:
+            call_log_summary = attempt("call_log_summary", lambda: get_patient_log_summary(record))
+            if call_log_summary is not None:
+                attempt("fhi_recommendations", lambda: get_call_log_recommendations(
+                    record, get_shared_fhi_recommendations(), call_log_summary
+                ))
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            if errors:
+                self.failed += 1
+            else:
+                self.completed += 1
+        print(f"Prefetched {key} in {elapsed:.1f}s: {', '.join(prefetched) or 'nothing'}"
+              + (f" (failed: {', '.join(errors)})" if errors else ""))
+        return {"patient": key, "prefetched": prefetched, "errors": errors, "seconds": round(elapsed, 3)}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"pending": len(self._timers), "completed": self.completed, "failed": self.failed}
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher() -> PatientPrefetcher:
+    """
+    Return the process-wide prefetcher, listening to the patient registry on first use.
+
+    Set PREFETCH_ON_CALL_LOG=0 to create it without listening.
+    """
+    global _prefetcher
+    if _prefetcher is None:
+        with _prefetcher_lock:
+            if _prefetcher is None:
+                registry = get_patient_registry()
+                prefetcher = PatientPrefetcher(registry)
+                if PREFETCH_ON_CALL_LOG:
+                    registry.add_listener(prefetcher.file_added)
+                _prefetcher = prefetcher
+    return _prefetcher
@@ -1,13 +1,38 @@
-import chromadb
-from chromadb.utils import embedding_functions
-from typing import List, Dict
+from typing import Dict, Iterable, Iterator, List, Optional, Set
 # from load_json import load_fhi_recommendations
 import re
 import json
-from typing import List, Optional
-import requests
+import hashlib
 import os
+import time
+import threading
 from datetime import datetime, timedelta
+from bm25 import BM25Index
+
+FHI_RECOMMENDATIONS_FILE = "fhi-recommendations.json"
+# Overridable so the sync can be pointed at a local stub server
+FHI_RECOMMENDATIONS_URL = os.environ.get(
+    "FHI_RECOMMENDATIONS_URL", "https://api-qa.helsedirektoratet.no/innhold/anbefalinger"
+)
+FHI_SUBSCRIPTION_KEY = "38221be99087442e97984dfaea18eebb"
+
+# How often a running engine re-syncs the recommendations
+SYNC_INTERVAL_SECONDS = 24 * 60 * 60
+
+# On-disk location of the persistent Chroma store (chroma reserves ".chroma" for its own cache)
+PERSIST_DIRECTORY = "chroma_db"
+
+# Number of documents embedded and written to the collection at a time
+INGEST_BATCH_SIZE = 32
+
+# Upper bound on passage length; all-MiniLM-L6-v2 truncates input beyond ~256 tokens
+CHUNK_MAX_CHARS = 700
+
+# Passages fetched per requested recommendation, so deduplication per parent still fills the result
+PASSAGE_OVERSAMPLE = 4
+
+# Reciprocal rank fusion constant for combining vector and BM25 rankings
+RRF_K = 60
 
 # Create a simple Document class first
 class Document:
@@ -15,6 +40,23 @@ class Document:
         self.text = text
         self.metadata = metadata or {}
 
+class RecommendationsDelta:
+    """Recommendations added, changed or removed since the previous snapshot."""
+    def __init__(self, added: List[Document] = None, changed: List[Document] = None,
+                 removed: List[str] = None, not_modified: bool = False):
+        self.added = added or []
+        self.changed = changed or []
+        self.removed = removed or []
+        # True when the server answered 304 and nothing was downloaded
+        self.not_modified = not_modified
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+    def __repr__(self):
+        return (f"RecommendationsDelta(added={len(self.added)}, changed={len(self.changed)}, "
+                f"removed={len(self.removed)}, not_modified={self.not_modified})")
+
 def is_health_recommendations_outdated(filename):
     # Check if file exists
     if not os.path.exists(filename):
@@ -27,6 +69,74 @@ def is_health_recommendations_outdated(filename):
     # Check if file is older than 1 day
     return (current_time - file_time) > timedelta(days=1)
 
+def _iter_json_array(f, chunk_size: int = 64 * 1024) -> Iterator:
+    """
+    Incrementally decode the items of a top-level JSON array from a file.
+
+    Only the current chunk and the item being decoded are held in memory.
+    Yields nothing if the file does not contain a JSON array.
+    """
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size).lstrip()
+    if not buffer.startswith("["):
+        return
+    buffer = buffer[1:]
+    eof = False
+
+    while True:
+        buffer = buffer.lstrip().lstrip(",").lstrip()
+        if buffer.startswith("]"):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            # Item is incomplete, read more of the file
+            if eof:
+                raise
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+def _item_to_document(item: dict) -> Document:
+    # Use get() with empty string defaults for missing fields
+    doc_id = item.get('id', '')
+    title = item.get('tittel', '')
+    text = item.get('tekst', '')
+
+    content = f"Tittel: {title}\n\nInnhold:\n{text}"
+    return Document(
+        text=content,
+        metadata={
+            "id": doc_id,
+            "title": title
+        }
+    )
+
+def iter_json_documents(json_path: str, strict: bool = False) -> Iterator[Document]:
+    """
+    Stream entries of a JSON file as Documents, one at a time.
+    Stops early (after a warning) if the file cannot be read or parsed.
+
+    Args:
+        json_path: Path to JSON file
+        strict: Raise instead of stopping early, for callers that must tell a
+            partial read from the whole file
+
+    Yields:
+        Document objects
+    """
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            for item in _iter_json_array(f):
+                yield _item_to_document(item)
+    except (json.JSONDecodeError, FileNotFoundError, AttributeError) as e:
+        if strict:
+            raise
+        print(f"Could not read documents from {json_path}: {e}")
+
 def load_json_documents(json_path: str) -> List[Document]:
     """
     Load JSON file and convert entries to Documents with graceful error handling.
@@ -39,59 +149,135 @@ def load_json_documents(json_path: str) -> List[Document]:
         List of Document objects
     """
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            
-        if not isinstance(data, list):
-            return []
-            
-        documents = []
-        for item in data:
-            # Use get() with empty string defaults for missing fields
-            doc_id = item.get('id', '')
-            title = item.get('tittel', '')
-            text = item.get('tekst', '')
-            
-            content = f"Tittel: {title}\n\nInnhold:\n{text}"
-            doc = Document(
-                text=content,
-                metadata={
-                    "id": doc_id,
-                    "title": title
-                }
-            )
-            documents.append(doc)
-            
+        documents = list(iter_json_documents(json_path))
         print(f"Loaded {len(documents)} documents")
         return documents
         
-    except (json.JSONDecodeError, FileNotFoundError, Exception):
+    except Exception:
         return []
 
 
+def _sync_state_path(json_path: str) -> str:
+    return os.path.splitext(json_path)[0] + ".sync.json"
 
+def _write_atomically(path: str, text: str) -> None:
+    """Replace a file in one step, so readers and later syncs never see it half-written."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
 
-def load_fhi_recommendations():
-    health_recommendations_file = "fhi-recommendations.json"
+def _read_sync_state(json_path: str) -> dict:
+    """Validators and per-id versions recorded by the previous sync."""
+    try:
+        with open(_sync_state_path(json_path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, FileNotFoundError):
+        pass
 
-    if is_health_recommendations_outdated(health_recommendations_file):
-        health_api_url = "https://api-qa.helsedirektoratet.no/innhold/anbefalinger"
-        headers = {
-            "Cache-Control": "no-cache",
-            "Ocp-Apim-Subscription-Key": "38221be99087442e97984dfaea18eebb"
-        }
+    # No state yet: derive the versions from the existing snapshot
+    versions = {}
+    if os.path.exists(json_path):
+        with open(json_path, "r", encoding="utf-8") as f:
+            try:
+                for item in _iter_json_array(f):
+                    versions[item.get("id", "")] = item.get("sistOppdatert", "")
+            except json.JSONDecodeError:
+                versions = {}
+    return {"versions": versions}
 
-        # Make the GET request
-        response = requests.get(health_api_url, headers=headers)
+def sync_fhi_recommendations(json_path: str = FHI_RECOMMENDATIONS_FILE,
+                             url: str = FHI_RECOMMENDATIONS_URL) -> RecommendationsDelta:
+    """
+    Fetch the recommendations and compute what changed since the previous snapshot.
+
+    Sends If-None-Match / If-Modified-Since from the previous response, so an
+    unchanged payload costs a 304 and no parsing. Otherwise each entry's id and
+    sistOppdatert are compared with the previous snapshot, and the new payload
+    and sync state are written to disk.
+
+    Args:
+        json_path: Local snapshot of the recommendations
+        url: Recommendations endpoint
+
+    Returns:
+        RecommendationsDelta with the added, changed and removed recommendations
+    """
+    import requests
+
+    state = _read_sync_state(json_path)
+    headers = {
+        "Cache-Control": "no-cache",
+        "Ocp-Apim-Subscription-Key": FHI_SUBSCRIPTION_KEY
+    }
+    if os.path.exists(json_path):
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+
+    response = requests.get(url, headers=headers, timeout=60)
 
-        # Save the response to a JSON file
-        with open(health_recommendations_file, "w", encoding="utf-8") as f:
-            f.write(response.text)
-        print(f"Downloaded new health recommendations to {health_recommendations_file}")
+    if response.status_code == 304:
+        # Mark the snapshot as fresh again
+        os.utime(json_path)
+        print(f"Health recommendations in {json_path} not modified on server")
+        return RecommendationsDelta(not_modified=True)
+    response.raise_for_status()
+
+    items = response.json()
+    if not isinstance(items, list):
+        raise ValueError(f"Unexpected recommendations payload from {url}")
+
+    old_versions = state.get("versions", {})
+    new_versions = {}
+    delta = RecommendationsDelta()
+    for item in items:
+        doc_id = item.get("id", "")
+        new_versions[doc_id] = item.get("sistOppdatert", "")
+        if doc_id not in old_versions:
+            delta.added.append(_item_to_document(item))
+        elif old_versions[doc_id] != new_versions[doc_id]:
+            delta.changed.append(_item_to_document(item))
+    delta.removed = [doc_id for doc_id in old_versions if doc_id not in new_versions]
+
+    # Save the response to a JSON file, then the state that refers to it
+    _write_atomically(json_path, response.text)
+    _write_atomically(_sync_state_path(json_path), json.dumps({
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "versions": new_versions,
+    }))
+
+    print(f"Synced health recommendations to {json_path}: {delta}")
+    return delta
+
+def update_fhi_recommendations_file():
+    """Sync the recommendations if the local copy is outdated. Returns the file path."""
+    health_recommendations_file = FHI_RECOMMENDATIONS_FILE
+
+    if is_health_recommendations_outdated(health_recommendations_file):
+        sync_fhi_recommendations(health_recommendations_file, FHI_RECOMMENDATIONS_URL)
     else:
         print(f"Health recommendations in {health_recommendations_file} are up to date (less than 1 day old)")
 
-    return load_json_documents(health_recommendations_file)
+    return health_recommendations_file
+
+def load_fhi_recommendations():
+    return load_json_documents(update_fhi_recommendations_file())
+
+def iter_fhi_recommendations(strict: bool = False) -> Iterator[Document]:
+    """Like load_fhi_recommendations, but streams documents instead of building a list."""
+    return iter_json_documents(update_fhi_recommendations_file(), strict=strict)
+
+def discard_sync_state(json_path: str = FHI_RECOMMENDATIONS_FILE) -> None:
+    """Forget the sync validators, so the next sync downloads the full payload instead of a 304."""
+    try:
+        os.remove(_sync_state_path(json_path))
+    except FileNotFoundError:
+        pass
 
 
 
@@ -102,75 +288,473 @@ def remove_html_tags(text):
     clean_text = ' '.join(clean_text.split())
     return clean_text
 
+def split_into_passages(html_text: str, max_chars: int = CHUNK_MAX_CHARS) -> List[str]:
+    """
+    Split a recommendation's HTML into passage-sized plain text chunks.
+
+    Sections start at each <dt> term (so a term stays with its <dd>
+    definitions), and at paragraphs, list items and headings for
+    recommendations without a definition list. Consecutive short sections are
+    merged, and sections longer than max_chars are split on sentence ends.
+    """
+    sections = []
+    for part in re.split(r'(?i)(?=<(?:dt|p|li|h[1-6])[\s>])', html_text):
+        # Keep a visible separator between a term and its definition
+        part = re.sub(r'(?i)</dt>', ': ', part)
+        clean = ' '.join(re.sub(r'<[^>]+>', ' ', part).split())
+        if clean:
+            sections.append(clean)
+
+    pieces = []
+    for section in sections:
+        if len(section) <= max_chars:
+            pieces.append(section)
+            continue
+        for sentence in re.split(r'(?<=[.!?])\s+', section):
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(' ', 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                pieces.append(sentence[:cut])
+                sentence = sentence[cut:].lstrip()
+            if sentence:
+                pieces.append(sentence)
+
+    passages = []
+    for piece in pieces:
+        if passages and len(passages[-1]) + 1 + len(piece) <= max_chars:
+            passages[-1] += ' ' + piece
+        else:
+            passages.append(piece)
+    return passages
+
+def snapshot_version(json_path: str = FHI_RECOMMENDATIONS_FILE) -> Optional[str]:
+    """Identifies the version of the local recommendations snapshot by mtime and size."""
+    try:
+        stat = os.stat(json_path)
+    except FileNotFoundError:
+        return None
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def content_hash(text: str) -> str:
+    """Stable fingerprint of a cleaned recommendation, used to detect changes."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
 class FHI_recommendations:
-    def __init__(self, collection_name: str = "fhi_recommendations"):
-        """Initialize the document store with ChromaDB."""
-        self.client = chromadb.Client()
+    def __init__(self, collection_name: str = "fhi_recommendation_passages", persist_directory: str = PERSIST_DIRECTORY, lazy: bool = False,
+                 batch_size: int = INGEST_BATCH_SIZE):
+        """
+        Initialize the document store with a persistent ChromaDB client.
+
+        Args:
+            collection_name: Name of the Chroma collection
+            persist_directory: Directory of the on-disk Chroma store
+            lazy: If True, defer client creation and ingestion to the first query;
+                only the BM25 index is built, in a background thread
+            batch_size: Number of documents embedded and written per batch
+        """
         self.collection_name = collection_name
-        # Use the default all-MiniLM-L6-v2 embedding function
-        self.embedding_function = embedding_functions.DefaultEmbeddingFunction()
-        
+        self.persist_directory = persist_directory
+        self.batch_size = batch_size
+        self.client = None
+        self.collection = None
+        self.embedding_function = None
+        # Guards initialization and all collection access, so one instance can
+        # be shared between Streamlit sessions and Flask worker threads
+        self._lock = threading.RLock()
+        self._ready = False
+        self._last_sync = 0.0
+        # Version of the snapshot the index was last built or updated from
+        self.corpus_version = None
+        self._sync_thread = None
+        self._init_thread = None
+        self._lexical_thread = None
+
+        # BM25 index over the same passages. It has its own lock so lexical
+        # queries are answered while the model is still loading.
+        self.lexical_index = BM25Index()
+        self._lexical_lock = threading.RLock()
+        self._lexical_hashes = {}
+        self._lexical_passages = {}
+        self._lexical_built = False
+
+        if lazy:
+            # Parse the recommendations file now, not on the first lexical query
+            self.start_lexical_index()
+        else:
+            self._ensure_ready()
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready
+
+    def _ensure_ready(self) -> None:
+        """Create the client and ingest documents on first use."""
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+
+            # Imported here so chromadb and the embedding runtime load on first use
+            import chromadb
+            from chromadb.config import Settings
+            from chromadb.utils import embedding_functions
+
+            self.client = chromadb.Client(Settings(
+                chroma_db_impl="duckdb+parquet",
+                persist_directory=self.persist_directory,
+                anonymized_telemetry=False,
+            ))
+            # Use the default all-MiniLM-L6-v2 embedding function
+            self.embedding_function = embedding_functions.DefaultEmbeddingFunction()
+
+            try:
+                # Try to get existing collection first
+                self.collection = self.client.get_collection(
+                    name=self.collection_name,
+                    embedding_function=self.embedding_function
+                )
+            except:
+                # Create new collection if it doesn't exist
+                self.collection = self.client.create_collection(
+                    name=self.collection_name,
+                    embedding_function=self.embedding_function
+                )
+
+            # Stream the full corpus through batched ingestion
+            snapshot_ids = set()
+            snapshot_complete = False
+
+            def documents():
+                nonlocal snapshot_complete
+                try:
+                    for doc in iter_fhi_recommendations(strict=True):
+                        snapshot_ids.add(doc.metadata["id"])
+                        yield doc
+                    snapshot_complete = True
+                except (json.JSONDecodeError, FileNotFoundError, AttributeError) as e:
+                    print(f"Could not read all FHI recommendations, keeping the stored ones: {e}")
+                    # A 304 would keep the broken snapshot; download it again on the next sync
+                    discard_sync_state(FHI_RECOMMENDATIONS_FILE)
+
+            self.load(documents())
+            # load() only upserts: drop what the server removed, in this sync or while the app was
+            # down, but only from a snapshot that parsed to the end
+            if snapshot_complete and snapshot_ids:
+                self.prune(snapshot_ids)
+
+            self._last_sync = time.time()
+            self.corpus_version = snapshot_version()
+            self._lexical_built = True
+            self._ready = True
+
+    def start_background_init(self) -> None:
+        """Load the model and ingest documents in a background thread."""
+        with self._lexical_lock:
+            if self._ready or (self._init_thread is not None and self._init_thread.is_alive()):
+                return
+            self._init_thread = threading.Thread(target=self._init_quietly, daemon=True)
+            self._init_thread.start()
+
+    def _init_quietly(self) -> None:
         try:
-            # Try to get existing collection first
-            self.collection = self.client.get_collection(
-                name=collection_name,
-                embedding_function=self.embedding_function
-            )
-        except:
-            # Create new collection if it doesn't exist
-            self.collection = self.client.create_collection(
-                name=collection_name,
-                embedding_function=self.embedding_function
-            )
+            self._ensure_ready()
+        except Exception as e:
+            print(f"Error initializing FHI recommendations: {e}")
 
-        docs = load_fhi_recommendations()
-        if docs:  # Only load if we have documents
-            self.load(docs[:100])
+    def start_lexical_index(self) -> None:
+        """Build the BM25 index in a background thread."""
+        with self._lexical_lock:
+            if self._lexical_built or self._lexical_thread is not None:
+                return
+            self._lexical_thread = threading.Thread(target=self._index_quietly, name="fhi-bm25", daemon=True)
+            self._lexical_thread.start()
+
+    def _index_quietly(self) -> None:
+        try:
+            self._ensure_lexical_index()
+        except Exception as e:
+            print(f"Error building the FHI lexical index: {e}")
 
-    def load(self, documents: List[Dict[str, str]]) -> None:
+    def _ensure_lexical_index(self) -> None:
+        """Build the BM25 index from the local recommendations file (no model, no network)."""
+        if self._lexical_built:
+            return
+        with self._lexical_lock:
+            if self._lexical_built:
+                return
+            for doc in iter_json_documents(FHI_RECOMMENDATIONS_FILE):
+                doc_id = doc.metadata["id"]
+                doc_hash = content_hash(remove_html_tags(doc.text))
+                if self._lexical_hashes.get(doc_id) != doc_hash:
+                    self._index_lexically(doc_id, *self._split_document(doc), doc_hash)
+            self._lexical_built = True
+
+    @staticmethod
+    def _split_document(doc: Document):
+        """Return the title and passages of a recommendation."""
+        title = doc.metadata["title"]
+        html_text = doc.text.split("Innhold:\n", 1)[-1]
+        return title, split_into_passages(html_text) or [title]
+
+    def _index_lexically(self, doc_id: str, title: str, passages: List[str], doc_hash: str) -> None:
+        with self._lexical_lock:
+            self._unindex_lexically(doc_id)
+            passage_ids = []
+            for n, passage in enumerate(passages):
+                passage_id = f"{doc_id}#{n}"
+                self.lexical_index.add(passage_id, f"{title}: {passage}", {
+                    "parent_id": doc_id,
+                    "title": title,
+                    "content_hash": doc_hash,
+                    "chunk": n,
+                })
+                passage_ids.append(passage_id)
+            self._lexical_passages[doc_id] = passage_ids
+            self._lexical_hashes[doc_id] = doc_hash
+
+    def _unindex_lexically(self, doc_id: str) -> None:
+        with self._lexical_lock:
+            for passage_id in self._lexical_passages.pop(doc_id, []):
+                self.lexical_index.remove(passage_id)
+            self._lexical_hashes.pop(doc_id, None)
+
+    def apply_delta(self, delta: RecommendationsDelta) -> Dict[str, int]:
+        """Apply a sync result to the index, touching only the affected recommendations."""
+        with self._lock:
+            for doc_id in delta.removed:
+                self.collection.delete(where={"parent_id": doc_id})
+                self._unindex_lexically(doc_id)
+            stats = self.load(delta.added + delta.changed)
+            if delta.removed:
+                self.client.persist()
+            self.corpus_version = snapshot_version()
+        stats["removed"] = len(delta.removed)
+        return stats
+
+    def prune(self, keep_ids: Set[str]) -> int:
+        """
+        Delete every recommendation in the store that is not in keep_ids.
+
+        Returns:
+            Number of recommendations removed
+        """
+        with self._lock:
+            stored = self.collection.get(include=["metadatas"])
+            removed = {metadata["parent_id"] for metadata in stored["metadatas"] if metadata} - set(keep_ids)
+            for doc_id in removed:
+                self.collection.delete(where={"parent_id": doc_id})
+                self._unindex_lexically(doc_id)
+            if removed:
+                self.client.persist()
+                print(f"FHI recommendations: removed {len(removed)} documents no longer in the corpus")
+        return len(removed)
+
+    def refresh(self) -> RecommendationsDelta:
+        """Sync the recommendations from the server and apply the delta to the index."""
+        self._ensure_ready()
+        delta = sync_fhi_recommendations()
+        self._last_sync = time.time()
+        if delta:
+            self.apply_delta(delta)
+        return delta
+
+    def _refresh_if_due(self) -> None:
+        """Start a background refresh once SYNC_INTERVAL_SECONDS have passed."""
+        if time.time() - self._last_sync < SYNC_INTERVAL_SECONDS:
+            return
+        with self._lock:
+            if self._sync_thread is not None and self._sync_thread.is_alive():
+                return
+            self._last_sync = time.time()
+            self._sync_thread = threading.Thread(target=self._refresh_quietly, daemon=True)
+            self._sync_thread.start()
+
+    def _refresh_quietly(self) -> None:
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Error refreshing FHI recommendations: {e}")
+
+    def load(self, documents: Iterable[Document], batch_size: Optional[int] = None) -> Dict[str, int]:
         """
         Load documents into the ChromaDB collection.
-        
+
+        Documents are consumed lazily in batches: each batch is embedded with
+        a single call to the embedding model and written to the collection
+        before the next batch is read, so memory stays bounded by the batch
+        size rather than the corpus size.
+
+        Each document is indexed as passages (see split_into_passages) that
+        carry the document id as parent_id. Documents are keyed by a hash of
+        their cleaned text; documents whose hash matches the one already
+        stored are reused as-is, so only new or changed documents are split
+        and sent through the embedding model.
+
         Args:
-            documents: List of document dictionaries containing text and metadata
+            documents: Iterable of Document objects containing text and metadata
+            batch_size: Documents per batch (default: the instance's batch_size)
+
+        Returns:
+            Dictionary with the number of "reused" and "embedded" documents
         """
+        batch_size = batch_size or self.batch_size
+        stats = {"reused": 0, "embedded": 0}
+
+        batch = []
+        for doc in documents:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                self._load_batch(batch, stats)
+                batch = []
+        if batch:
+            self._load_batch(batch, stats)
+
+        if stats["embedded"]:
+            with self._lock:
+                self.client.persist()
+
+        print(f"FHI recommendations: reused {stats['reused']} documents, embedded {stats['embedded']} documents "
+              f"({stats.get('passages', 0)} passages)")
+        return stats
+
+    def _load_batch(self, documents: List[Document], stats: Dict[str, int]) -> None:
+        """Split, embed and upsert the passages of the new or changed documents of one batch."""
         # Extract required fields from documents
         texts = [remove_html_tags(doc.text) for doc in documents]
         ids = [doc.metadata["id"] for doc in documents]
-        metadatas = [{"title": doc.metadata["title"]} for doc in documents]
-        
-        # Add documents to collection
-        self.collection.add(
-            documents=texts,
-            ids=ids,
-            metadatas=metadatas
-        )
+        hashes = [content_hash(text) for text in texts]
+
+        with self._lock:
+            # Every document has a first passage; its metadata carries the
+            # parent's hash (no embedding involved)
+            existing = self.collection.get(ids=[f"{doc_id}#0" for doc_id in ids], include=["metadatas"])
+            stored_hashes = {
+                metadata["parent_id"]: metadata.get("content_hash")
+                for metadata in existing["metadatas"] if metadata
+            }
+
+            changed = [i for i, doc_id in enumerate(ids) if stored_hashes.get(doc_id) != hashes[i]]
+
+            passage_ids, passages, embed_texts, metadatas = [], [], [], []
+            for i in changed:
+                if ids[i] in stored_hashes:
+                    # Drop the old passages, the new text may split differently
+                    self.collection.delete(where={"parent_id": ids[i]})
+
+                title, doc_passages = self._split_document(documents[i])
+                if self._lexical_hashes.get(ids[i]) != hashes[i]:
+                    self._index_lexically(ids[i], title, doc_passages, hashes[i])
+                for n, passage in enumerate(doc_passages):
+                    passage_ids.append(f"{ids[i]}#{n}")
+                    passages.append(passage)
+                    # Embed the title with each passage so it keeps its context
+                    embed_texts.append(f"{title}: {passage}")
+                    metadatas.append({
+                        "parent_id": ids[i],
+                        "title": title,
+                        "content_hash": hashes[i],
+                        "chunk": n,
+                    })
+
+            if passage_ids:
+                # Embed the whole batch in one model call
+                self.collection.upsert(
+                    embeddings=self.embedding_function(embed_texts),
+                    documents=passages,
+                    ids=passage_ids,
+                    metadatas=metadatas
+                )
+
+        # Documents whose vectors were reused may still be missing lexically
+        for i, doc_id in enumerate(ids):
+            if self._lexical_hashes.get(doc_id) != hashes[i]:
+                self._index_lexically(doc_id, *self._split_document(documents[i]), hashes[i])
+
+        stats["reused"] += len(ids) - len(changed)
+        stats["embedded"] += len(changed)
+        stats["passages"] = stats.get("passages", 0) + len(passage_ids)
 
     def query(self, query_text: str, n_results: int = 3) -> List[Dict]:
         """
-        Query the document store for relevant documents.
-        
+        Query the document store for the best-matching passages.
+
+        Vector and BM25 rankings are combined with reciprocal rank fusion.
+        Before the embedding model has loaded (cold start), the model is
+        loaded in the background and the query is answered from the BM25
+        index alone. Passages are deduplicated per recommendation, so each
+        result is a distinct recommendation represented by its most
+        relevant passage.
+
         Args:
             query_text: The search query
-            n_results: Number of results to return (default: 3)
-            
+            n_results: Number of recommendations to return (default: 3)
+
         Returns:
-            List of relevant documents with their metadata
+            List of relevant passages with the parent's id and metadata
         """
-        results = self.collection.query(
-            query_texts=[query_text],
-            n_results=n_results
-        )
-        
-        # Format results into document-like structure
+        if not self._ready:
+            self.start_background_init()
+            return self.lexical_query(query_text, n_results)
+
+        self._refresh_if_due()
+        with self._lock:
+            n_passages = min(n_results * PASSAGE_OVERSAMPLE, self.collection.count())
+            if n_passages == 0:
+                return []
+            results = self.collection.query(
+                query_texts=[query_text],
+                n_results=n_passages
+            )
+        with self._lexical_lock:
+            lexical_hits = self.lexical_index.search(query_text, n_results=n_passages)
+
+        # Reciprocal rank fusion of both rankings
+        scores = {}
+        passages = {}
+        for rank, passage_id in enumerate(results['ids'][0]):
+            scores[passage_id] = scores.get(passage_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+            passages[passage_id] = (results['documents'][0][rank], results['metadatas'][0][rank])
+        for rank, (passage_id, _) in enumerate(lexical_hits):
+            scores[passage_id] = scores.get(passage_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+            if passage_id not in passages:
+                passages[passage_id] = self._lexical_passage(passage_id)
+
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        return self._best_per_parent([passages[passage_id] for passage_id in ranked], n_results)
+
+    def lexical_query(self, query_text: str, n_results: int = 3) -> List[Dict]:
+        """BM25-only query; needs neither the embedding model nor the Chroma store."""
+        self._ensure_lexical_index()
+        with self._lexical_lock:
+            hits = self.lexical_index.search(query_text, n_results=n_results * PASSAGE_OVERSAMPLE)
+            passages = [self._lexical_passage(passage_id) for passage_id, _ in hits]
+        return self._best_per_parent(passages, n_results)
+
+    def _lexical_passage(self, passage_id: str):
+        """Return (passage, metadata) for a passage of the BM25 index."""
+        text, metadata = self.lexical_index.get(passage_id)
+        # Indexed as "<title>: <passage>"
+        return text[len(metadata["title"]) + 2:], metadata
+
+    @staticmethod
+    def _best_per_parent(passages, n_results: int) -> List[Dict]:
+        """Keep the first (best ranked) passage of each recommendation."""
         documents = []
-        for i in range(len(results['ids'][0])):
+        seen_parents = set()
+        for text, metadata in passages:
+            if metadata['parent_id'] in seen_parents:
+                continue
+            seen_parents.add(metadata['parent_id'])
             documents.append({
-                'id': results['ids'][0][i],
-                'text': results['documents'][0][i],
-                'metadata': results['metadatas'][0][i]
+                'id': metadata['parent_id'],
+                'text': text,
+                'metadata': metadata
             })
-            
+            if len(documents) == n_results:
+                break
+
         return documents
     
     def get_relevant_fhi_recommendations(self, query, max_recommendations=2):
@@ -181,15 +765,32 @@ class FHI_recommendations:
 
         for i, doc in enumerate(results, 1):
             relevant_fhi_recommendations += f"{i}. {doc['metadata']['title']}\n"
-            # Take first 300 characters of content
-            content = doc['text'][:300]
-            if len(doc['text']) > 300:
-                content += "..."
-            relevant_fhi_recommendations += f"{content}\n\n"
+            # The best-matching passage, already bounded by CHUNK_MAX_CHARS
+            relevant_fhi_recommendations += f"{doc['text']}\n\n"
 
         return relevant_fhi_recommendations
 
 
+# Process-wide engine shared by all Streamlit sessions and Flask request threads
+_shared_recommendations = None
+_shared_recommendations_lock = threading.Lock()
+
+def get_shared_fhi_recommendations() -> FHI_recommendations:
+    """
+    Return the process-wide FHI_recommendations instance.
+
+    The instance is created lazily and only builds its BM25 index, in the
+    background, until the first query, so callers (e.g. a new Streamlit
+    session) never block on model loading here.
+    """
+    global _shared_recommendations
+    if _shared_recommendations is None:
+        with _shared_recommendations_lock:
+            if _shared_recommendations is None:
+                _shared_recommendations = FHI_recommendations(lazy=True)
+    return _shared_recommendations
+
+
 # # Example usage:
 # if __name__ == "__main__":
 #     rag = FHI_recommendations()
@@ -0,0 +1,102 @@
+"""
+Import-time profile of the app's modules.
+
+Imports each module in a fresh interpreter with `python -X importtime` and
+reports the total import time together with the slowest packages it pulled
+in, so it is easy to see where startup time goes.
+
+Usage:
+    python startup_profile.py [module ...]
+"""
+import subprocess
+import sys
+from collections import defaultdict
+
+# main.py is a Streamlit script and cannot be imported on its own; its imports are covered by these
+DEFAULT_MODULES = [
+    "nebius_inference",
+    "singleflight",
+    "jobs",
+    "nebius_vision",
+    "rag_fhi",
+    "bm25",
+    "journal_cache",
+    "journal_condenser",
+    "journal_retrieval",
+    "answer_cache",
+    "summary_cache",
+    "image_store",
+    "image_preprocessing",
+    "patient_search",
+    "patient_registry",
+    "patient_store",
+    "patient_briefing",
+    "prefetch",
+    "batch_briefing",
+    "tts",
+    "api",
+]
+
+
+def _importtime_lines(code: str):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+    )
+    return result, [
+        line for line in result.stderr.splitlines()
+        if line.startswith("import time:") and "cumulative" not in line
+    ]
+
+
+def _parse(line: str):
+    # "import time: <self us> | <cumulative us> | <indented module name>"
+    self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+    return int(self_us), int(cumulative_us), name.strip()
+
+
+def profile_import(module: str, baseline: set = frozenset()):
+    """
+    Import a module in a subprocess and parse its -X importtime output.
+
+    Returns:
+        (total microseconds, {top-level package: cumulative microseconds}, error or None)
+    """
+    result, lines = _importtime_lines(f"import {module}")
+    packages = defaultdict(int)
+    total = 0
+    for line in lines:
+        self_us, cumulative_us, name = _parse(line)
+        if name == module:
+            total = cumulative_us
+        if name in baseline:
+            # Imported by interpreter startup, not by the module
+            continue
+        # Attribute each module's own import time to its top-level package
+        packages[name.split(".")[0]] += self_us
+
+    error = None
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed"
+    packages.pop(module, None)
+    return total, dict(packages), error
+
+
+def main(modules):
+    _, lines = _importtime_lines("pass")
+    baseline = {_parse(line)[2] for line in lines}
+
+    print(f"{'module':<20} {'import ms':>10}  slowest packages")
+    for module in modules:
+        total, packages, error = profile_import(module, baseline)
+        if error:
+            print(f"{module:<20} {'failed':>10}  {error}")
+            continue
+        slowest = sorted(packages.items(), key=lambda x: x[1], reverse=True)[:5]
+        breakdown = ", ".join(f"{name} {us / 1000:.0f}ms" for name, us in slowest)
+        print(f"{module:<20} {total / 1000:>10.1f}  {breakdown}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or DEFAULT_MODULES)
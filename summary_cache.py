@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional
+
+from nebius_inference import inference, MODEL, temperature
+
+SUMMARY_CACHE_PATH = ".cache/summaries.sqlite3"
+SUMMARY_CACHE_MAX_ENTRIES = 2000
+SUMMARY_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+
+class SummaryCache:
+    """
+    Persistent cache of LLM summaries backed by SQLite.
+
+    Entries are keyed by a hash of model, prompt template, temperature and
+    source text. Least recently used entries are evicted beyond max_entries,
+    entries expire after ttl_seconds, and entries recorded for a source file
+    are dropped once that file's mtime changes.
+    """
+
+    def __init__(self, path: str = SUMMARY_CACHE_PATH, max_entries: int = SUMMARY_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = SUMMARY_CACHE_TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS summaries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    source_path TEXT,
+                    source_mtime_ns INTEGER,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS summaries_source ON summaries (source_path)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS summaries_access ON summaries (last_access)")
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def make_key(model: str, template: str, temperature: float, source_text: str) -> str:
+        payload = json.dumps([model, template, float(temperature), source_text])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT value, created_at FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if now - created_at > self.ttl_seconds:
+                conn.execute("DELETE FROM summaries WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute("UPDATE summaries SET last_access = ? WHERE key = ?", (now, key))
+            conn.commit()
+            return value
+
+    def put(self, key: str, value: str, source_path: Optional[str] = None,
+            source_mtime_ns: Optional[int] = None) -> None:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?, ?, ?)",
+                (key, value, source_path, source_mtime_ns, now, now),
+            )
+            # Expire old entries, then evict least recently used beyond the cap
+            conn.execute("DELETE FROM summaries WHERE created_at < ?", (now - self.ttl_seconds,))
+            conn.execute("""
+                DELETE FROM summaries WHERE key IN (
+                    SELECT key FROM summaries ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+            conn.commit()
+
+    def invalidate_source(self, source_path: str, current_mtime_ns: Optional[int] = None) -> int:
+        """Drop entries for a source file, except those recorded at current_mtime_ns."""
+        with self._lock:
+            conn = self._connection()
+            cursor = conn.execute(
+                "DELETE FROM summaries WHERE source_path = ? AND source_mtime_ns IS NOT ?",
+                (source_path, current_mtime_ns),
+            )
+            conn.commit()
+            return cursor.rowcount
+
+    def get_or_compute(self, key: str, compute: Callable[[], str], source_path: Optional[str] = None) -> str:
+        """Return the cached value for key, or compute and store it."""
+        source_mtime_ns = None
+        if source_path is not None:
+            source_path = os.path.abspath(source_path)
+            try:
+                source_mtime_ns = os.stat(source_path).st_mtime_ns
+                self.invalidate_source(source_path, source_mtime_ns)
+            except FileNotFoundError:
+                source_path = None
+
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value, source_path, source_mtime_ns)
+        return value
+
+
+# Process-wide cache shared by the Streamlit app and the API
+summary_cache = SummaryCache()
+
+
+def prompt_signature(template: str) -> str:
+    """Identifies the model, prompt template and temperature a summary was generated with."""
+    return SummaryCache.make_key(MODEL, template, temperature, "")[:16]
+
+
+def cached_inference(template: str, text: str, source_path: Optional[str] = None) -> str:
+    """
+    Run inference on template.format(text=text), memoized in the summary cache.
+
+    Args:
+        template: Prompt template with a {text} placeholder
+        text: Source text (journal, call log) inserted into the template
+        source_path: File the text was read from; its entries are invalidated when it changes
+    """
+    key = SummaryCache.make_key(MODEL, template, temperature, text)
+    return summary_cache.get_or_compute(
+        key, lambda: inference(template.format(text=text)), source_path=source_path
+    )
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from answer_cache import AnswerCache, answer_scope, content_words
+
+
+def same_embedding(question):
+    # Worst case for the threshold: every question embeds identically
+    return np.ones(4, dtype=np.float32) / 2
+
+
+@pytest.fixture
+def cache():
+    return AnswerCache(similarity=0.92, embed=same_embedding)
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("blodtype?", "blodtrykk?"),
+    ("Is the patient allergic to penicillin?", "Is the patient allergic to aspirin?"),
+    ("Does the patient take insulin?", "Does the patient not take insulin?"),
+    ("Bruker pasienten blodfortynnende?", "Bruker pasienten ikke blodfortynnende?"),
+    ("Blood pressure at 08:00?", "Blood pressure at 09:00?"),
+    ("Current medication?", "Previous medication?"),
+])
+def test_near_misses_are_not_served(cache, cached, asked):
+    scope = answer_scope("journal")
+    cache.put(scope, cached, "cached answer")
+    assert cache.lookup(scope, asked)[0] is None
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("Any allergies?", "Does the patient have any allergies?"),
+    ("Har pasienten allergier?", "Hvilke allergier har pasienten?"),
+    ("What is the blood type", "blood type?"),
+])
+def test_rewordings_are_served(cache, cached, asked):
+    scope = answer_scope("journal")
+    cache.put(scope, cached, "cached answer")
+    assert cache.lookup(scope, asked)[0] == "cached answer"
+    assert cache.stats()["semantic_hits"] + cache.stats()["exact_hits"] == 1
+
+
+def test_answers_do_not_leak_between_journals(cache):
+    cache.put(answer_scope("journal A"), "Any allergies?", "penicillin")
+    assert cache.lookup(answer_scope("journal B"), "Any allergies?")[0] is None
+
+
+def test_semantic_hits_need_the_model():
+    cache = AnswerCache(embed=lambda question: None)
+    scope = answer_scope("journal")
+    cache.put(scope, "Any allergies?", "penicillin")
+    assert cache.lookup(scope, "any allergies")[0] == "penicillin"
+    assert cache.lookup(scope, "Does the patient have any allergies?")[0] is None
+
+
+def test_negations_are_content_words():
+    assert content_words("Does the patient not smoke?") != content_words("Does the patient smoke?")
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import rag_fhi
+
+
+def recommendation(n, updated="2024-01-01T00:00"):
+    return {
+        "id": f"rec-{n}",
+        "tittel": f"Anbefaling {n}",
+        "tekst": f"<p>Behandling av tilstand {n} med tiltak {n * 7}.</p>",
+        "sistOppdatert": updated,
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        payload = json.dumps(self.server.items).encode("utf-8")
+        etag = '"' + hashlib.sha1(payload).hexdigest() + '"'
+        self.server.requests.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.items = [recommendation(n) for n in range(18)]
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def snapshot(tmp_path, stub_server, monkeypatch):
+    path = str(tmp_path / "fhi-recommendations.json")
+    monkeypatch.setattr(rag_fhi, "FHI_RECOMMENDATIONS_FILE", path)
+    monkeypatch.setattr(rag_fhi, "FHI_RECOMMENDATIONS_URL", f"http://127.0.0.1:{stub_server.server_port}/")
+    return path
+
+
+def make_outdated(path):
+    two_days_ago = time.time() - 2 * 24 * 60 * 60
+    os.utime(path, (two_days_ago, two_days_ago))
+
+
+def test_sync_reports_delta_and_uses_conditional_get(snapshot, stub_server):
+    url = rag_fhi.FHI_RECOMMENDATIONS_URL
+    delta = rag_fhi.sync_fhi_recommendations(snapshot, url)
+    assert len(delta.added) == 18 and not delta.changed and not delta.removed
+
+    # Unchanged payload: the stored ETag turns the next sync into a 304
+    delta = rag_fhi.sync_fhi_recommendations(snapshot, url)
+    assert delta.not_modified and not delta
+    assert stub_server.requests[-1].get("If-None-Match")
+
+    stub_server.items = [recommendation(n) for n in range(15)]
+    stub_server.items[0] = recommendation(0, updated="2025-06-01T00:00")
+    delta = rag_fhi.sync_fhi_recommendations(snapshot, url)
+    assert [doc.metadata["id"] for doc in delta.changed] == ["rec-0"]
+    assert sorted(delta.removed) == ["rec-15", "rec-16", "rec-17"]
+    assert not delta.added
+
+
+def fake_embedding_function():
+    def embed(texts):
+        vectors = []
+        for text in texts:
+            digest = hashlib.sha256(text.encode("utf-8")).digest()
+            vectors.append([byte / 255 for byte in digest[:16]])
+        return vectors
+    return embed
+
+
+def stored_parents(engine):
+    metadatas = engine.collection.get(include=["metadatas"])["metadatas"]
+    return {metadata["parent_id"] for metadata in metadatas}
+
+
+def test_recommendations_removed_while_down_leave_the_store(snapshot, stub_server, tmp_path, monkeypatch):
+    pytest.importorskip("chromadb")
+    from chromadb.utils import embedding_functions
+
+    # The real model is downloaded on first use; the store is what is under test
+    monkeypatch.setattr(embedding_functions, "DefaultEmbeddingFunction", fake_embedding_function)
+    persist_directory = str(tmp_path / "chroma_db")
+
+    engine = rag_fhi.FHI_recommendations(persist_directory=persist_directory)
+    assert len(stored_parents(engine)) == 18
+
+    # The server drops three recommendations; the next start syncs before loading
+    stub_server.items = [recommendation(n) for n in range(15)]
+    make_outdated(snapshot)
+    engine = rag_fhi.FHI_recommendations(persist_directory=persist_directory)
+    assert stored_parents(engine) == {f"rec-{n}" for n in range(15)}
+    assert all(hit["id"] != "rec-17" for hit in engine.lexical_query("tilstand 17", n_results=5))
+
+
+def test_truncated_snapshot_prunes_nothing_and_is_downloaded_again(snapshot, stub_server, tmp_path, monkeypatch):
+    pytest.importorskip("chromadb")
+    from chromadb.utils import embedding_functions
+
+    monkeypatch.setattr(embedding_functions, "DefaultEmbeddingFunction", fake_embedding_function)
+    persist_directory = str(tmp_path / "chroma_db")
+    engine = rag_fhi.FHI_recommendations(persist_directory=persist_directory)
+    assert len(stored_parents(engine)) == 18
+    assert not os.path.exists(snapshot + ".tmp")
+
+    # A snapshot cut off in the middle, e.g. by a crash in an earlier version
+    with open(snapshot, "r+", encoding="utf-8") as f:
+        f.truncate(os.path.getsize(snapshot) // 2)
+    engine = rag_fhi.FHI_recommendations(persist_directory=persist_directory)
+    assert len(stored_parents(engine)) == 18
+
+    # The next sync fetches the full payload instead of accepting a 304
+    make_outdated(snapshot)
+    requests_before = len(stub_server.requests)
+    engine = rag_fhi.FHI_recommendations(persist_directory=persist_directory)
+    assert not stub_server.requests[requests_before].get("If-None-Match")
+    assert len(stored_parents(engine)) == 18
+    with open(snapshot, "r", encoding="utf-8") as f:
+        assert len(json.load(f)) == 18
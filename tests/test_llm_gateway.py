@@ -0,0 +1,158 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("openai")
+
+import openai
+
+from llm_gateway import LLMGateway
+
+MODEL = "fake-model"
+
+
+def completion(content):
+    return {
+        "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": MODEL,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+    }
+
+
+def chunk(content):
+    return {
+        "id": "chatcmpl-1", "object": "chat.completion.chunk", "created": 0, "model": MODEL,
+        "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}],
+    }
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """POST /chat/completions, answering with the server's scripted responses in order."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(request)
+        with self.server.lock:
+            status, headers = self.server.script.pop(0) if self.server.script else (200, {})
+        if status != 200:
+            body = json.dumps({"error": {"message": "scripted failure", "type": "error"}}).encode()
+            self._send(status, {"Content-Type": "application/json", **headers}, body)
+        elif request.get("stream"):
+            events = [f"data: {json.dumps(chunk(word))}\n\n" for word in ("Puls ", "92")] + ["data: [DONE]\n\n"]
+            self._send(200, {"Content-Type": "text/event-stream"}, "".join(events).encode())
+        else:
+            self._send(200, {"Content-Type": "application/json"}, json.dumps(completion("ok")).encode())
+
+    def _send(self, status, headers, body):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenAIHandler)
+    server.script = []
+    server.requests = []
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+
+def make_gateway(server, **settings):
+    settings.setdefault("rate_per_second", 1000)
+    settings.setdefault("burst", 1000)
+    # Tiny backoff, so a wait can only come from Retry-After
+    settings.setdefault("backoff_base", 0.001)
+    return LLMGateway(base_url=f"http://127.0.0.1:{server.server_port}/v1/", api_key="test", **settings)
+
+
+def ask(gateway):
+    return gateway.chat_completion(MODEL, [{"role": "user", "content": "Puls?"}]).choices[0].message.content
+
+
+def test_rate_limited_request_is_retried_after_retry_after(server):
+    server.script = [(429, {"Retry-After": "0.3"})]
+    gateway = make_gateway(server, max_retries=2)
+
+    started = time.monotonic()
+    assert ask(gateway) == "ok"
+    assert time.monotonic() - started >= 0.3
+
+    stats = gateway.stats.snapshot()
+    assert len(server.requests) == 2
+    assert (stats["requests"], stats["retried"], stats["failed"], stats["in_flight"], stats["queued"]) == (2, 1, 0, 0, 0)
+    assert sum(stats["latency_histogram"].values()) == 1
+
+
+def test_gives_up_after_max_retries(server):
+    server.script = [(429, {"Retry-After": "0"})] * 3
+    gateway = make_gateway(server, max_retries=1)
+
+    with pytest.raises(openai.RateLimitError):
+        ask(gateway)
+    stats = gateway.stats.snapshot()
+    assert (stats["requests"], stats["retried"], stats["failed"], stats["in_flight"]) == (2, 1, 1, 0)
+
+
+def test_client_errors_are_not_retried(server):
+    server.script = [(400, {})]
+    gateway = make_gateway(server, max_retries=3)
+
+    with pytest.raises(openai.BadRequestError):
+        ask(gateway)
+    assert len(server.requests) == 1
+    assert gateway.stats.snapshot()["failed"] == 1
+
+
+def call_with_timeout(function, seconds=5):
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault("value", function()), daemon=True)
+    thread.start()
+    thread.join(seconds)
+    assert not thread.is_alive(), "request is still waiting for a concurrency slot"
+    return result["value"]
+
+
+def test_streams_release_their_slot(server):
+    gateway = make_gateway(server, max_concurrency=1)
+    messages = [{"role": "user", "content": "Puls?"}]
+
+    assert "".join(gateway.chat_completion_stream(MODEL, messages)) == "Puls 92"
+    assert gateway.stats.snapshot()["in_flight"] == 0
+    # With a single slot, the next request only runs if the stream gave it back
+    assert call_with_timeout(lambda: ask(gateway)) == "ok"
+
+    # Also when the reader stops early
+    stream = gateway.chat_completion_stream(MODEL, messages)
+    assert next(stream) == "Puls "
+    assert gateway.stats.snapshot()["in_flight"] == 1
+    stream.close()
+    assert gateway.stats.snapshot()["in_flight"] == 0
+    assert call_with_timeout(lambda: ask(gateway)) == "ok"
+
+    stats = gateway.stats.snapshot()
+    assert (stats["requests"], stats["failed"]) == (4, 0)
+    # The abandoned stream records no latency
+    assert sum(stats["latency_histogram"].values()) == 3
+
+
+def test_settings_are_read_when_the_gateway_is_created(monkeypatch):
+    monkeypatch.setenv("LLM_MAX_CONCURRENCY", "3")
+    monkeypatch.setenv("LLM_MAX_RETRIES", "7")
+    monkeypatch.setenv("NEBIUS_BASE_URL", "http://127.0.0.1:1/v1/")
+    gateway = LLMGateway(api_key="test")
+    assert (gateway.max_concurrency, gateway.max_retries, gateway.base_url) == (3, 7, "http://127.0.0.1:1/v1/")
+    assert LLMGateway(api_key="test", max_retries=0).max_retries == 0